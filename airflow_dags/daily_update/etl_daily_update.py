@@ -10,7 +10,7 @@ from dotenv import load_dotenv
 here = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(here, "../../"))
 
-from src.etl.main_etl import ETLPipeline
+from src.etl.main_etl import NBASTATS_TEAM_TABLES, ETLPipeline
 
 load_dotenv()
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
@@ -38,27 +38,19 @@ dag = DAG(
 
 @task(dag=dag)
 def run_etl_daily_update():
+    # Only used for the first run, afterwards the stored watermarks
+    # limit the update to games with new scores, odds or team stats.
     start_date = "2023-09-01"
-    ETL = ETLPipeline(start_date)
-
-    ETL.load_features_data(
-        [
-            "team_nbastats_general_traditional",
-            "team_nbastats_general_advanced",
-            "team_nbastats_general_fourfactors",
-            "team_nbastats_general_opponent",
-        ]
+    ETL = ETLPipeline(
+        start_date, incremental=True, max_workers=len(NBASTATS_TEAM_TABLES)
     )
 
-    ETL.prepare_all_tables()
-
-    ETL.feature_creation_pre_merge()
-
-    ETL.merge_features_data()
-
-    ETL.feature_creation_post_merge()
+    if ETL.games_to_update is not None and len(ETL.games_to_update) == 0:
+        ETL.save_watermarks()
+        return
 
-    ETL.clean_and_save_combined_features()
+    # Stages are checkpointed, a failed run resumes after its last completed stage
+    ETL.run()
 
 
 # Set the task to be executed by the DAG
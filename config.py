@@ -96,6 +96,37 @@ FEATURE_TABLE_INFO = {
     },
 }
 
+# Features used by the deployed models (bet_management.bet_decisions), the
+# ETL serving mode only builds these
+MODEL_FEATURES = [
+    "rest_diff_hv",
+    "day_of_season",
+    "last_5_hv",
+    "streak_hv",
+    "point_diff_last_5_hv",
+    "point_diff_hv",
+    "win_pct_hv",
+    "pie_percentile_away_all_advanced",
+    "home_team_avg_point_diff",
+    "net_rating_away_all_advanced",
+    "net_rating_home_all_advanced",
+    "plus_minus_home_all_traditional",
+    "e_net_rating_zscore_away_all_advanced",
+    "net_rating_zscore_away_all_advanced",
+    "plus_minus_away_all_opponent",
+    "away_team_avg_point_diff",
+    "plus_minus_away_all_traditional",
+    "pie_zscore_away_all_advanced",
+    "e_net_rating_away_all_advanced",
+    "plus_minus_percentile_away_all_traditional",
+    "net_rating_zscore_home_l2w_advanced",
+    "e_net_rating_home_all_advanced",
+    "w_zscore_away_all_traditional",
+    "pie_away_all_advanced",
+    "w_pct_zscore_away_all_traditional",
+    "e_net_rating_percentile_away_l2w_advanced",
+]
+
 
 TEAM_FULL_NAME_MAP = {
     "Washington Wizards": "WAS",
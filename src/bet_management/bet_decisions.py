@@ -1,5 +1,6 @@
 import datetime
 import os
+import sys
 
 import autokeras as ak
 import pandas as pd
@@ -7,9 +8,14 @@ import pytz
 from dotenv import load_dotenv
 from pycaret import classification as pyc_cls
 from pycaret import regression as pyc_reg
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from tensorflow.keras.models import load_model
 
+here = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(here, "../.."))
+
+import config
+
 load_dotenv()
 DB_ENDPOINT = os.getenv("DB_ENDPOINT")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
@@ -41,12 +47,25 @@ class Predictions:
         self.dl_cls_model_1 = None
         self.dl_reg_model_1 = None
 
-    def load_data(self, current_date=True, start_date=None, end_date=None):
-        """Load data from database based on date filters."""
+    def load_data(self, features, current_date=True, start_date=None, end_date=None):
+        """
+        Load games, lines and only the given feature columns from the typed
+        all_features table, based on date filters. Until the ETL has created
+        all_features, the features are read from all_features_json.
+        """
         try:
             start_datetime, end_datetime = self._get_date_range(
                 current_date, start_date, end_date
             )
+            if inspect(self.database_engine).has_table("all_features"):
+                features_table = "all_features"
+                feature_columns = ", ".join(f'features."{col}"' for col in features)
+            else:
+                print("all_features not found, loading features from all_features_json")
+                features_table = "all_features_json"
+                feature_columns = ", ".join(
+                    f"features.data -> '{col}' AS \"{col}\"" for col in features
+                )
             query = f"""
                     SELECT
                         games.game_id,
@@ -54,10 +73,10 @@ class Predictions:
                         games.home_team,
                         games.away_team,
                         games.open_line AS open_line_copy,
-                        features.data,
+                        {feature_columns},
                         lines.{self.line_source}_home_line
                     FROM games
-                    LEFT JOIN all_features_json AS features 
+                    LEFT JOIN {features_table} AS features
                         ON games.game_id = features.game_id
                     LEFT JOIN (
                         SELECT game_id, {self.line_source}_home_line
@@ -73,6 +92,8 @@ class Predictions:
             self.df = pd.read_sql(
                 query, self.database_engine, params=(start_datetime, end_datetime)
             )
+            # JSON values are decoded as Python objects
+            self.df[features] = self.df[features].infer_objects()
         except Exception as e:
             print(f"An error occurred while loading data: {e}")
 
@@ -111,11 +132,8 @@ class Predictions:
     def create_predictions(self, df, features):
         """Create predictions using loaded models and return a new DataFrame."""
 
-        # Flatten the 'data' column to extract features
-        data_df = df["data"].apply(pd.Series)
-
-        # Select only the relevant features
-        selected_features = data_df[features]
+        # Select only the relevant features, loaded as typed columns
+        selected_features = df[features].copy()
 
         # Add the line to the selected features
         if self.line_type == "open":
@@ -130,8 +148,8 @@ class Predictions:
         selected_features = selected_features.loc[non_null_indices]
         df = df.loc[non_null_indices]
 
-        # Create a new DataFrame by concatenating only the relevant feature columns
-        new_df = pd.concat([df, selected_features], axis=1)
+        # Create a new DataFrame with the feature columns used for prediction
+        new_df = pd.concat([df.drop(columns=features), selected_features], axis=1)
 
         # Make predictions using the selected features
         ml_cls_predictions_1 = pyc_cls.predict_model(
@@ -265,34 +283,7 @@ def main_predictions(current_date, start_date, end_date, line_type="open"):
         NBA_BETTING_BASE_DIR + "/models/AutoDL/autokeras_reg_dl_2023_10_30_06_40_04"
     )
 
-    feature_set = [
-        "rest_diff_hv",
-        "day_of_season",
-        "last_5_hv",
-        "streak_hv",
-        "point_diff_last_5_hv",
-        "point_diff_hv",
-        "win_pct_hv",
-        "pie_percentile_away_all_advanced",
-        "home_team_avg_point_diff",
-        "net_rating_away_all_advanced",
-        "net_rating_home_all_advanced",
-        "plus_minus_home_all_traditional",
-        "e_net_rating_zscore_away_all_advanced",
-        "net_rating_zscore_away_all_advanced",
-        "plus_minus_away_all_opponent",
-        "away_team_avg_point_diff",
-        "plus_minus_away_all_traditional",
-        "pie_zscore_away_all_advanced",
-        "e_net_rating_away_all_advanced",
-        "plus_minus_percentile_away_all_traditional",
-        "net_rating_zscore_home_l2w_advanced",
-        "e_net_rating_home_all_advanced",
-        "w_zscore_away_all_traditional",
-        "pie_away_all_advanced",
-        "w_pct_zscore_away_all_traditional",
-        "e_net_rating_percentile_away_l2w_advanced",
-    ]
+    feature_set = config.MODEL_FEATURES
 
     try:
         predictions = Predictions(line_type=line_type)
@@ -303,7 +294,10 @@ def main_predictions(current_date, start_date, end_date, line_type="open"):
             dl_reg_model_1_path=dl_reg_model_path,
         )
         predictions.load_data(
-            current_date=current_date, start_date=start_date, end_date=end_date
+            feature_set,
+            current_date=current_date,
+            start_date=start_date,
+            end_date=end_date,
         )
         predictions.df = predictions.create_predictions(
             predictions.df, features=feature_set
@@ -340,34 +334,7 @@ def on_demand_predictions(
         NBA_BETTING_BASE_DIR + "/models/AutoDL/autokeras_reg_dl_2023_10_30_06_40_04"
     )
 
-    feature_set = [
-        "rest_diff_hv",
-        "day_of_season",
-        "last_5_hv",
-        "streak_hv",
-        "point_diff_last_5_hv",
-        "point_diff_hv",
-        "win_pct_hv",
-        "pie_percentile_away_all_advanced",
-        "home_team_avg_point_diff",
-        "net_rating_away_all_advanced",
-        "net_rating_home_all_advanced",
-        "plus_minus_home_all_traditional",
-        "e_net_rating_zscore_away_all_advanced",
-        "net_rating_zscore_away_all_advanced",
-        "plus_minus_away_all_opponent",
-        "away_team_avg_point_diff",
-        "plus_minus_away_all_traditional",
-        "pie_zscore_away_all_advanced",
-        "e_net_rating_away_all_advanced",
-        "plus_minus_percentile_away_all_traditional",
-        "net_rating_zscore_home_l2w_advanced",
-        "e_net_rating_home_all_advanced",
-        "w_zscore_away_all_traditional",
-        "pie_away_all_advanced",
-        "w_pct_zscore_away_all_traditional",
-        "e_net_rating_percentile_away_l2w_advanced",
-    ]
+    feature_set = config.MODEL_FEATURES
 
     try:
         predictions = Predictions(line_type=line_type)
@@ -378,7 +345,10 @@ def on_demand_predictions(
             dl_reg_model_1_path=dl_reg_model_path,
         )
         predictions.load_data(
-            current_date=current_date, start_date=start_date, end_date=end_date
+            feature_set,
+            current_date=current_date,
+            start_date=start_date,
+            end_date=end_date,
         )
         predictions.df = predictions.create_predictions(
             predictions.df, features=feature_set
@@ -12,6 +12,7 @@ from sqlalchemy import (
     PrimaryKeyConstraint,
     String,
     create_engine,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base
@@ -56,6 +57,20 @@ class AllFeaturesJSONTable(Base):
     __table_args__ = (PrimaryKeyConstraint("game_id"),)
     game_id = Column(String)  # Unique identifier for the game
     data = Column(JSONB)  # JSON data containing all features
+    data_hash = Column(String)  # Hash of data, rows are only rewritten when it changes
+
+
+# all_features, the typed copy with one column per feature, has no model here:
+# the ETL creates it from the columns it outputs and adds new ones as they appear
+
+
+# Define the ETLWatermarksTable model
+class ETLWatermarksTable(Base):
+    __tablename__ = "etl_watermarks"
+    __table_args__ = (PrimaryKeyConstraint("table_name"),)
+    table_name = Column(String)  # Source table tracked by the incremental ETL
+    watermark = Column(DateTime)  # Latest change already processed from the table
+    last_update = Column(DateTime)  # Date and time the watermark was advanced
 
 
 # Define the PredictionsTable model
@@ -413,9 +428,24 @@ class FivethirtyeightGamesTable(Base):
     total_rating = Column(Float)
 
 
+# Columns added to tables after they were first created, create_all only creates
+# missing tables. Each statement is safe to rerun.
+MIGRATIONS = [
+    "ALTER TABLE all_features_json ADD COLUMN IF NOT EXISTS data_hash VARCHAR",
+]
+
+
+def run_migrations(engine):
+    with engine.begin() as connection:
+        for statement in MIGRATIONS:
+            connection.execute(text(statement))
+
+
 if __name__ == "__main__":
-    # Creates all database tables defined above that haven't been created yet.
+    # Creates all database tables defined above that haven't been created yet
+    # and adds the columns added to them since.
     engine = create_engine(
         f"postgresql://postgres:{DB_PASSWORD}@{DB_ENDPOINT}/nba_betting"
     )
     Base.metadata.create_all(engine)
+    run_migrations(engine)
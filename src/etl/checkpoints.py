@@ -0,0 +1,215 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+
+here = os.path.dirname(os.path.realpath(__file__))
+
+load_dotenv()
+CHECKPOINT_DIR = os.getenv(
+    "ETL_CHECKPOINT_DIR", os.path.join(here, "../../data/etl_checkpoints")
+)
+# Runs left behind (failed and never resumed) are deleted after this many days
+CHECKPOINT_RETENTION_DAYS = int(os.getenv("ETL_CHECKPOINT_RETENTION_DAYS", "7"))
+
+
+def code_fingerprint(*objects):
+    """
+    Hash of the source code of functions, methods or classes, changes whenever
+    one of them is edited.
+    """
+    hasher = hashlib.sha256()
+    for obj in objects:
+        # numba dispatchers keep the original function in py_func
+        obj = getattr(obj, "py_func", obj)
+        hasher.update(inspect.getsource(obj).encode())
+    return hasher.hexdigest()
+
+
+def data_fingerprint(value):
+    """
+    Hash of a stage output: DataFrames (values, index, columns and dtypes),
+    dicts of DataFrames, or plain JSON-serializable values.
+    """
+    hasher = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        hasher.update(str(list(value.columns)).encode())
+        hasher.update(str(list(value.dtypes.astype(str))).encode())
+        hasher.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            hasher.update(str(key).encode())
+            hasher.update(data_fingerprint(value[key]).encode())
+    else:
+        hasher.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return hasher.hexdigest()
+
+
+class StageCheckpointer:
+    """
+    Stage outputs of one ETL run stored as Arrow IPC files under
+    checkpoint_dir/run_id/stage_name, with a manifest recording for each stage
+    the key it was computed with (input and code fingerprint) and the
+    fingerprint of its output. A stage is valid when its stored key matches
+    the key of the current run.
+    """
+
+    def __init__(self, checkpoint_dir, run_id):
+        self.run_dir = os.path.join(os.path.abspath(checkpoint_dir), run_id)
+        self.manifest_path = os.path.join(self.run_dir, "manifest.json")
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        os.makedirs(self.run_dir, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(temp_path, self.manifest_path)
+
+    @staticmethod
+    def stage_key(input_fingerprint, code_fingerprint):
+        return hashlib.sha256(
+            f"{input_fingerprint}:{code_fingerprint}".encode()
+        ).hexdigest()
+
+    def is_valid(self, stage_name, key):
+        entry = self.manifest.get(stage_name)
+        return entry is not None and entry["key"] == key
+
+    def output_fingerprint(self, stage_name):
+        return self.manifest[stage_name]["output_fingerprint"]
+
+    def save(self, stage_name, key, outputs):
+        """
+        Stores the outputs (dict of attribute name to DataFrame, dict of
+        DataFrames or None) of a stage and returns their fingerprint.
+        """
+        stage_dir = os.path.join(self.run_dir, stage_name)
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        os.makedirs(stage_dir)
+
+        files = {}
+        for name, value in outputs.items():
+            if isinstance(value, pd.DataFrame):
+                files[name] = self._write_frame(stage_dir, name, value)
+            elif isinstance(value, dict):
+                files[name] = {
+                    table_name: self._write_frame(
+                        stage_dir, f"{name}__{table_name}", frame
+                    )
+                    for table_name, frame in value.items()
+                }
+            else:
+                files[name] = None
+
+        output_fingerprint = data_fingerprint(outputs)
+        self.manifest[stage_name] = {
+            "key": key,
+            "output_fingerprint": output_fingerprint,
+            "files": files,
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._write_manifest()
+        return output_fingerprint
+
+    def load(self, stage_name):
+        outputs = {}
+        for name, files in self.manifest[stage_name]["files"].items():
+            if isinstance(files, str):
+                outputs[name] = self._read_frame(files)
+            elif isinstance(files, dict):
+                outputs[name] = {
+                    table_name: self._read_frame(path)
+                    for table_name, path in files.items()
+                }
+            else:
+                outputs[name] = None
+        return outputs
+
+    def delete(self):
+        """Deletes every stored stage of the run."""
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+        self.manifest = {}
+
+    @staticmethod
+    def remove_expired(checkpoint_dir, retention_days=CHECKPOINT_RETENTION_DAYS):
+        """
+        Deletes the runs under checkpoint_dir whose manifest wasn't written in
+        the last retention_days days and returns their run ids.
+        """
+        checkpoint_dir = os.path.abspath(checkpoint_dir)
+        if not os.path.isdir(checkpoint_dir):
+            return []
+        cutoff = datetime.now().timestamp() - retention_days * 24 * 60 * 60
+        expired = []
+        for run_id in sorted(os.listdir(checkpoint_dir)):
+            run_dir = os.path.join(checkpoint_dir, run_id)
+            if not os.path.isdir(run_dir):
+                continue
+            manifest_path = os.path.join(run_dir, "manifest.json")
+            last_write = os.path.getmtime(
+                manifest_path if os.path.exists(manifest_path) else run_dir
+            )
+            if last_write < cutoff:
+                shutil.rmtree(run_dir, ignore_errors=True)
+                expired.append(run_id)
+        return expired
+
+    def invalidate(self, stage_names):
+        for stage_name in stage_names:
+            self.manifest.pop(stage_name, None)
+        self._write_manifest()
+
+    @staticmethod
+    def _write_frame(stage_dir, name, df):
+        path = os.path.join(stage_dir, f"{name}.arrow")
+        # Arrow has no sparse type, sparse columns are stored dense and their
+        # fill values kept in the schema metadata to restore them on load
+        sparse_columns = {
+            col: getattr(dtype.fill_value, "item", lambda: dtype.fill_value)()
+            for col, dtype in df.dtypes.items()
+            if isinstance(dtype, pd.SparseDtype)
+        }
+        if sparse_columns:
+            df = df.copy(deep=False)
+            for col in sparse_columns:
+                df[col] = df[col].sparse.to_dense()
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        if sparse_columns:
+            table = table.replace_schema_metadata(
+                {
+                    **table.schema.metadata,
+                    b"sparse_columns": json.dumps(sparse_columns).encode(),
+                }
+            )
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return path
+
+    @staticmethod
+    def _read_frame(path):
+        with pa.OSFile(path, "rb") as source:
+            table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas()
+        metadata = table.schema.metadata or {}
+        if b"sparse_columns" in metadata:
+            for col, fill_value in json.loads(metadata[b"sparse_columns"]).items():
+                df[col] = df[col].astype(pd.SparseDtype(df[col].dtype, fill_value))
+        return df
+
+
+if __name__ == "__main__":
+    pass
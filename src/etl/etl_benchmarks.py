@@ -0,0 +1,760 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+here = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(here, "../.."))
+
+import config
+from src.etl.feature_creation import FeatureCreationPostMerge, FeatureCreationPreMerge
+from src.etl.main_etl import JSONB_COPY_CHUNK_SIZE, ETLPipeline
+from src.etl.synthetic_data import synthetic_etl_inputs
+from src.etl.team_schedule import TeamScheduleIndex
+
+# Offline benchmarks for the ETL hot paths on synthetic data, run from the repo
+# root with: python -m src.etl.etl_benchmarks --output benchmarks.json
+
+# A full rebuild peaks at about 1.5x its data, against 2.4x before the merge
+# released its inputs
+MAX_PEAK_RATIO = 2.0
+
+
+# REFERENCE IMPLEMENTATIONS
+
+
+def sequential_merge_game_to_nbastats_team(game, nbastats_team_dfs):
+    # One merge per table, side and game set, as done before the indexed merge
+    features_df = game.copy()
+    features_df["game_date"] = features_df["game_datetime"].dt.date.astype("str")
+    for table_name, table in nbastats_team_dfs.items():
+        table["merge_date"] = (table["to_date"].dt.date + pd.DateOffset(days=1)).astype(
+            "str"
+        )
+
+    for table_name, table in nbastats_team_dfs.items():
+        for team in ["home", "away"]:
+            for game_set in ["all", "l2w"]:
+                sub_df = table.loc[table.games == game_set].copy()
+
+                table_suffix = table_name.split("_")[-1]
+                columns_to_not_rename = ["team_name", "to_date", "merge_date", "games"]
+                sub_df.columns = [
+                    f"{col}_{team}_{game_set}_{table_suffix}"
+                    if col not in columns_to_not_rename
+                    else col
+                    for col in sub_df.columns
+                ]
+
+                features_df = features_df.merge(
+                    sub_df,
+                    left_on=["game_date", f"{team}_team"],
+                    right_on=["merge_date", "team_name"],
+                    how="left",
+                    suffixes=("", f"_{table_name}_{team}_{game_set}"),
+                    validate="1:1",
+                )
+
+                columns_to_drop = ["to_date", "merge_date", "team_name", "games"]
+                columns_to_drop = [
+                    col for col in columns_to_drop if col in features_df.columns
+                ]
+                features_df = features_df.drop(columns=columns_to_drop)
+
+    features_df = features_df.drop(columns=["game_date"])
+
+    return features_df
+
+
+def groupby_zscore_and_percentiles(df, zscore_cols, percentile_cols, date_col):
+    # One grouped transform per column, as done before the batched pass
+    def safe_zscore(s, ddof=1):
+        mean = s.mean()
+        std = s.std(ddof=ddof)
+        if std == 0:
+            return pd.Series([np.nan] * len(s), index=s.index)
+        return (s - mean) / std
+
+    def safe_percentile(s):
+        return s.rank(pct=True)
+
+    df = df.copy()
+    for col in dict.fromkeys(list(zscore_cols) + list(percentile_cols)):
+        if col in zscore_cols:
+            df[col + "_zscore"] = (
+                df.groupby(date_col)[col]
+                .transform(safe_zscore)
+                .where(df[col].notnull())
+            )
+        if col in percentile_cols:
+            df[col + "_percentile"] = (
+                df.groupby(date_col)[col]
+                .transform(safe_percentile)
+                .where(df[col].notnull())
+            )
+
+    return df
+
+
+def loop_days_since_last_game(df):
+    # Per-season groupby diff merged back to both sides, as done before the
+    # team schedule index
+    home_df = df[["game_datetime", "season", "home_team"]].rename(
+        columns={"home_team": "team"}
+    )
+    away_df = df[["game_datetime", "season", "away_team"]].rename(
+        columns={"away_team": "team"}
+    )
+    all_games_df = pd.concat([home_df, away_df], axis=0)
+    all_games_df.sort_values(["team", "game_datetime"], inplace=True)
+
+    df_list = []
+    for season in all_games_df["season"].unique():
+        season_df = all_games_df[all_games_df["season"] == season].copy()
+        season_df["days_since_last_game"] = (
+            season_df.groupby("team", observed=True)["game_datetime"].diff().dt.days
+        )
+        df_list.append(season_df)
+    df_result = pd.concat(df_list, axis=0)
+
+    df = pd.merge(
+        df,
+        df_result,
+        how="left",
+        left_on=["game_datetime", "season", "home_team"],
+        right_on=["game_datetime", "season", "team"],
+    )
+    df = pd.merge(
+        df,
+        df_result,
+        how="left",
+        left_on=["game_datetime", "season", "away_team"],
+        right_on=["game_datetime", "season", "team"],
+        suffixes=("_home", "_away"),
+    )
+    df.drop(columns=["team_home", "team_away"], inplace=True)
+    df["rest_diff_hv"] = (
+        df["days_since_last_game_home"] - df["days_since_last_game_away"]
+    )
+    return df
+
+
+def loop_team_performance_metrics(inbound_df):
+    # One pass per season and team with an iterrows streak, as done before the
+    # team-game segments
+    df = inbound_df.copy()
+    df.sort_values(["season", "game_datetime"], inplace=True)
+
+    metrics = [
+        "last_5_games_result",
+        "streak",
+        "win_pct",
+        "avg_point_diff",
+        "avg_point_diff_last_5",
+    ]
+    for col in metrics:
+        df[f"home_team_{col}"] = np.nan
+        df[f"away_team_{col}"] = np.nan
+
+    for season in df["season"].unique():
+        season_df = df.loc[df["season"] == season].copy()
+        for team in pd.concat(
+            [season_df["home_team"], season_df["away_team"]]
+        ).unique():
+            mask = (season_df["home_team"] == team) | (season_df["away_team"] == team)
+            team_df = season_df[mask].copy()
+
+            conditions = [
+                (~team_df["game_completed"]),
+                (
+                    (team_df["home_team"] == team)
+                    & (team_df["home_score"] > team_df["away_score"])
+                ),
+                (
+                    (team_df["away_team"] == team)
+                    & (team_df["away_score"] > team_df["home_score"])
+                ),
+                (
+                    (team_df["home_team"] == team)
+                    & (team_df["home_score"] < team_df["away_score"])
+                ),
+                (
+                    (team_df["away_team"] == team)
+                    & (team_df["away_score"] < team_df["home_score"])
+                ),
+            ]
+            team_df["performance"] = np.select(
+                conditions, [0, 1, 1, -1, -1], default=np.nan
+            )
+            team_df["last_5_games_result"] = (
+                team_df["performance"]
+                .rolling(window=5, min_periods=1)
+                .sum()
+                .shift(1)
+                .fillna(0)
+            )
+
+            streaks = []
+            current_streak = 0
+            for i, row in team_df.iterrows():
+                streaks.append(current_streak)
+                performance = row["performance"]
+                if performance == 0:
+                    continue
+                if current_streak == 0:
+                    current_streak = performance
+                elif np.sign(current_streak) == np.sign(performance):
+                    current_streak += performance
+                else:
+                    current_streak = performance
+            team_df["streak"] = streaks
+
+            team_df["win_pct"] = team_df["performance"].expanding().mean().shift(1)
+            team_df["point_diff"] = np.where(
+                team_df["home_team"] == team,
+                team_df["home_score"] - team_df["away_score"],
+                team_df["away_score"] - team_df["home_score"],
+            )
+            team_df["avg_point_diff"] = (
+                team_df["point_diff"].expanding().mean().shift(1).fillna(0)
+            )
+            team_df["avg_point_diff_last_5"] = (
+                team_df["point_diff"].rolling(window=5).mean().shift(1).fillna(0)
+            )
+
+            for col in metrics:
+                home_mask = (df["home_team"] == team) & mask
+                df.loc[home_mask, f"home_team_{col}"] = team_df.loc[home_mask, col]
+                away_mask = (df["away_team"] == team) & mask
+                df.loc[away_mask, f"away_team_{col}"] = team_df.loc[away_mask, col]
+
+    df["last_5_hv"] = (
+        df["home_team_last_5_games_result"] - df["away_team_last_5_games_result"]
+    )
+    df["streak_hv"] = df["home_team_streak"] - df["away_team_streak"]
+    df["win_pct_hv"] = df["home_team_win_pct"] - df["away_team_win_pct"]
+    df["point_diff_hv"] = (
+        df["home_team_avg_point_diff"] - df["away_team_avg_point_diff"]
+    )
+    df["point_diff_last_5_hv"] = (
+        df["home_team_avg_point_diff_last_5"] - df["away_team_avg_point_diff_last_5"]
+    )
+    return df
+
+
+def groupby_team_schedule(df, home_values, away_values):
+    # Per-team groupby shift, rolling, expanding and diff over the games of
+    # each season, as done before the team schedule index
+    sides = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "game_row": np.arange(len(df)),
+                    "is_home": is_home,
+                    "season": df["season"].to_numpy(),
+                    "team": df[f"{side}_team"].to_numpy(),
+                    "game_datetime": df["game_datetime"].to_numpy(),
+                    "values": values,
+                }
+            )
+            for side, is_home, values in [
+                ("home", True, home_values),
+                ("away", False, away_values),
+            ]
+        ],
+        ignore_index=True,
+    )
+    sides = sides.sort_values("game_datetime", kind="stable")
+    grouped = sides.groupby(["season", "team"], observed=True, sort=False)
+    results = {
+        "shift": grouped["values"].shift(1),
+        "rolling_sum_1": grouped["values"]
+        .rolling(5, min_periods=1)
+        .sum()
+        .droplevel([0, 1]),
+        "rolling_sum_5": grouped["values"]
+        .rolling(5, min_periods=5)
+        .sum()
+        .droplevel([0, 1]),
+        "expanding_mean": grouped["values"].expanding().mean().droplevel([0, 1]),
+        "days_since_previous_game": grouped["game_datetime"].diff().dt.days,
+    }
+
+    games = {}
+    for name, values in results.items():
+        for side, is_home in [("home", True), ("away", False)]:
+            side_values = values[sides["is_home"] == is_home]
+            games[f"{name}_{side}"] = pd.Series(
+                side_values.to_numpy(dtype=np.float64),
+                index=sides.loc[side_values.index, "game_row"].to_numpy(),
+            ).sort_index()
+    return pd.DataFrame(games)
+
+
+# CHECKS
+
+
+def _zscore_edge_cases(table, feature_cols, date_col, seed=0):
+    """
+    Copy of table with the groups the z-score special-cases: a date where a
+    feature is all NaN, a date with a single row and a date where a feature is
+    constant, plus scattered NaN values, rows without a date and float32
+    features.
+    """
+    rng = np.random.default_rng(seed)
+    table = table.copy()
+    dates = table[date_col].dropna().unique()
+    table.loc[table[date_col] == dates[0], feature_cols[0]] = np.nan
+    table = table.loc[(table[date_col] != dates[1]) | ~table[date_col].duplicated()]
+    table.loc[table[date_col] == dates[2], feature_cols[-1]] = 1.0
+    for col in feature_cols:
+        table[col] = table[col].mask(rng.random(len(table)) < 0.05)
+    table.loc[table.index[:3], date_col] = pd.NaT
+    float32_cols = feature_cols[::2]
+    table[float32_cols] = table[float32_cols].astype(np.float32)
+    return table
+
+
+def check_zscore_and_percentiles(tables):
+    """
+    The batched z-scores and percentiles must match the per-column groupby
+    reference on the given tables and on their edge cases (_zscore_edge_cases).
+    """
+    feature_creation = FeatureCreationPreMerge({})
+    for table_name, table in tables.items():
+        table_info = config.FEATURE_TABLE_INFO[table_name]
+        feature_cols = table_info["feature_columns"]
+        date_col = table_info["date_column"]
+        cases = {
+            "all rows": table,
+            "edge cases": _zscore_edge_cases(table, feature_cols, date_col),
+        }
+        for case, df in cases.items():
+            reference_df = groupby_zscore_and_percentiles(
+                df, feature_cols, feature_cols, date_col
+            )
+            batched_df = feature_creation._zscore_and_percentiles(
+                df, feature_cols, feature_cols, date_col
+            )
+            try:
+                pd.testing.assert_frame_equal(
+                    reference_df, batched_df, check_exact=True
+                )
+            except AssertionError as e:
+                print(
+                    f"\n*** Error Z-Scores Differ from Reference: {table_name}, {case}"
+                )
+                raise e
+
+
+def _team_history_games(game, seed=0):
+    """
+    Games with their season and the cases the team history special-cases: a
+    team with a single game in the first season, games in progress in the
+    middle of a season, which leave the streak unchanged, and tied games.
+    First games of each team-season (NaN rest days) and streaks reset at the
+    start of every season are in any multi-season game set.
+    """
+    rng = np.random.default_rng(seed)
+    df = game[
+        [
+            "game_id",
+            "game_datetime",
+            "home_team",
+            "away_team",
+            "home_score",
+            "away_score",
+            "game_completed",
+        ]
+    ]
+    df = FeatureCreationPostMerge(df)._add_season_timeframe_info(df.copy(deep=False))
+    df = df.drop(columns=["season_type", "reg_season_start_date"])
+
+    first_season = df["season"] == df["season"].iloc[0]
+    team = df.loc[first_season, "home_team"].iloc[0]
+    team_games = first_season & ((df["home_team"] == team) | (df["away_team"] == team))
+    df = df.drop(index=df.index[team_games][1:]).reset_index(drop=True)
+
+    completed = np.flatnonzero(df["game_completed"].astype(bool))
+    in_progress = rng.choice(completed, size=len(completed) // 50, replace=False)
+    df.loc[in_progress, "game_completed"] = False
+    tied = rng.choice(completed, size=len(completed) // 100, replace=False)
+    df.loc[tied, "away_score"] = df.loc[tied, "home_score"]
+    return df
+
+
+def check_team_history(game):
+    """
+    Days since last game and team performance metrics from the team schedule
+    index must match the per-team loop reference on the games of
+    _team_history_games.
+    """
+    df = _team_history_games(game)
+    reference_df = loop_team_performance_metrics(loop_days_since_last_game(df))
+    schedule_df = FeatureCreationPostMerge(df)._calculate_team_history(df.copy())
+    try:
+        pd.testing.assert_frame_equal(reference_df, schedule_df, check_exact=True)
+    except AssertionError as e:
+        print("\n*** Error Team History Differs from Reference")
+        raise e
+
+
+def check_team_schedule(game, seed=0):
+    """
+    Shift, rolling sums, expanding mean and days since previous game of the
+    team schedule index must match the per-team groupby reference on the games
+    of _team_history_games. Values are whole numbers with NaNs, like the
+    performances and point differentials, so sums are exact in both.
+    """
+    rng = np.random.default_rng(seed)
+    df = _team_history_games(game, seed=seed)
+    home_values, away_values = [
+        np.where(rng.random(len(df)) < 0.1, np.nan, rng.integers(-20, 20, len(df)))
+        for _ in range(2)
+    ]
+    reference_df = groupby_team_schedule(df, home_values, away_values)
+
+    schedule = TeamScheduleIndex.from_games(df)
+    values = schedule.from_sides(home_values, away_values)
+    results = {
+        "shift": schedule.shift(values),
+        "rolling_sum_1": schedule.rolling_sum(values, 5, min_periods=1),
+        "rolling_sum_5": schedule.rolling_sum(values, 5, min_periods=5),
+        "expanding_mean": schedule.expanding_mean(values),
+        "days_since_previous_game": schedule.days_since_previous_game(),
+    }
+    schedule_df = {}
+    for name, long_values in results.items():
+        (
+            schedule_df[f"{name}_home"],
+            schedule_df[f"{name}_away"],
+        ) = schedule.to_games(long_values)
+    schedule_df = pd.DataFrame(schedule_df)
+
+    try:
+        pd.testing.assert_frame_equal(reference_df, schedule_df, check_exact=True)
+    except AssertionError as e:
+        print("\n*** Error Team Schedule Differs from Reference")
+        raise e
+
+
+def check_asof_merge(game, nbastats_team_dfs):
+    """
+    The asof merge with max_staleness_days=0 must match the exact merge, on
+    the given tables, on tables without snapshots and on tables with only the
+    "all" game set, where the missing snapshots leave the features missing.
+    """
+    cases = {
+        "all snapshots": nbastats_team_dfs,
+        "no snapshots": {k: v.iloc[:0] for k, v in nbastats_team_dfs.items()},
+        "no l2w snapshots": {
+            k: v[v["games"] == "all"] for k, v in nbastats_team_dfs.items()
+        },
+    }
+    for case, tables in cases.items():
+        exact_df = ETLPipeline._merge_game_to_nbastats_team(
+            game, {k: v.copy() for k, v in tables.items()}
+        )
+        asof_df = ETLPipeline._merge_game_to_nbastats_team(
+            game,
+            {k: v.copy() for k, v in tables.items()},
+            merge_mode="asof",
+            max_staleness_days=0,
+        )
+        try:
+            pd.testing.assert_frame_equal(exact_df, asof_df, check_exact=True)
+        except AssertionError as e:
+            print(f"\n*** Error Asof Merge Differs from Exact Merge: {case}")
+            raise e
+
+
+# BENCHMARKS
+
+
+def _measure(func, *args):
+    # The traced run also warms up numba kernels and caches before the timed run
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    result = func(*args)
+    wall_time = time.perf_counter() - start_time
+
+    return result, {
+        "wall_time_s": round(wall_time, 4),
+        "peak_memory_mb": round(peak / 1024**2, 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=here,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_tables(nbastats_team_dfs):
+    return {
+        table_name: ETLPipeline._prepare_table(
+            table,
+            table_name,
+            config.TEAM_MAP,
+            config.FEATURE_TABLE_INFO[table_name]["primary_key"],
+        )
+        for table_name, table in nbastats_team_dfs.items()
+    }
+
+
+def feature_creation_pre_merge(nbastats_team_dfs):
+    return FeatureCreationPreMerge(nbastats_team_dfs).full_feature_creation()
+
+
+def feature_creation_post_merge(
+    combined_features, max_workers=1, team_encoding="dense"
+):
+    return FeatureCreationPostMerge(
+        combined_features, max_workers=max_workers, team_encoding=team_encoding
+    ).full_feature_creation()
+
+
+def serialize_jsonb(combined_features, chunk_size=JSONB_COPY_CHUNK_SIZE):
+    # Same cleaning as clean_and_save_combined_features, then every COPY chunk
+    df, _ = ETLPipeline.check_duplicates(combined_features, "game_id", filter=False)
+    df, _ = ETLPipeline.downcast_data_types(df, downcast_floats=True)
+    return sum(
+        len(ETLPipeline._serialize_jsonb_chunk(df.iloc[start : start + chunk_size]))
+        for start in range(0, len(df), chunk_size)
+    )
+
+
+def _frame_mb(value):
+    if isinstance(value, pd.DataFrame):
+        return value.memory_usage(deep=True).sum() / 1024**2
+    if isinstance(value, dict):
+        return sum(_frame_mb(v) for v in value.values())
+    return 0.0
+
+
+def _full_rebuild_stages(game, post_merge_workers):
+    return [
+        prepare_tables,
+        feature_creation_pre_merge,
+        lambda tables: ETLPipeline._merge_game_to_nbastats_team(
+            game, tables, consume_tables=True
+        ),
+        lambda df: feature_creation_post_merge(df, post_merge_workers),
+        lambda df: ETLPipeline.downcast_data_types(
+            ETLPipeline.check_duplicates(df, "game_id")[0],
+            downcast_floats=True,
+            report_memory=False,
+        )[0],
+    ]
+
+
+def full_rebuild_peak_memory(num_seasons, seed=0, post_merge_workers=1, warm_up=True):
+    """
+    Runs the stages of a full rebuild on synthetic data the way ETLPipeline.run
+    holds them, each stage output replacing its input, and returns the peak
+    traced memory next to the size of the largest stage output (the data).
+    With warm_up, the stages first run untraced on one season, so numba
+    compilation and first-call caches don't count towards the peak.
+    """
+    if warm_up:
+        game, data = synthetic_etl_inputs(1, seed=seed)
+        for stage in _full_rebuild_stages(game, post_merge_workers):
+            data = stage(data)
+
+    game, data = synthetic_etl_inputs(num_seasons, seed=seed)
+    data_mb = _frame_mb(data)
+    stages = _full_rebuild_stages(game, post_merge_workers)
+
+    tracemalloc.start()
+    for stage in stages:
+        data = stage(data)
+        data_mb = max(data_mb, _frame_mb(data))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "peak_memory_mb": round(peak / 1024**2, 2),
+        "data_mb": round(data_mb, 2),
+        "peak_to_data": round(peak / 1024**2 / data_mb, 2),
+    }
+
+
+def _shape(value):
+    if isinstance(value, pd.DataFrame):
+        return list(value.shape)
+    if isinstance(value, dict):
+        return [
+            sum(df.shape[0] for df in value.values()),
+            sum(df.shape[1] for df in value.values()),
+        ]
+    return value
+
+
+def benchmark_suite(
+    season_counts=(1, 5, 25),
+    seed=0,
+    compare_reference=True,
+    post_merge_workers=os.cpu_count(),
+    max_peak_ratio=MAX_PEAK_RATIO,
+):
+    """
+    Times prepare, pre-merge feature creation, the merge, post-merge feature
+    creation and JSONB serialization on synthetic data for each season count.
+    Each stage runs on the output of the previous one. With compare_reference
+    the merge is also run with the sequential reference implementation and
+    both results must be identical, and the asof merge, the z-scores, the
+    team schedule index and the team history are checked with
+    check_asof_merge, check_zscore_and_percentiles, check_team_schedule and
+    check_team_history. With post_merge_workers > 1 the season-sharded
+    post-merge is also timed and checked against the sequential one. JSONB
+    serialization is also timed with the sparse and codes team encodings.
+    The stages are then chained as in a full rebuild and the peak memory must
+    stay within max_peak_ratio times the data (None disables the check).
+    """
+    commit = _git_commit()
+    results = []
+    for num_seasons in season_counts:
+        game, nbastats_team_dfs = synthetic_etl_inputs(num_seasons, seed=seed)
+
+        def record(benchmark, inputs, output, stats, **extra):
+            results.append(
+                {
+                    "benchmark": benchmark,
+                    "commit": commit,
+                    "num_seasons": num_seasons,
+                    "num_games": len(game),
+                    "input_shape": _shape(inputs),
+                    "output_shape": _shape(output),
+                    **stats,
+                    **extra,
+                }
+            )
+            print(json.dumps(results[-1]))
+
+        prepared, stats = _measure(prepare_tables, nbastats_team_dfs)
+        record("prepare_table", nbastats_team_dfs, prepared, stats)
+
+        pre_merge, stats = _measure(feature_creation_pre_merge, prepared)
+        record("feature_creation_pre_merge", prepared, pre_merge, stats)
+        if compare_reference:
+            check_zscore_and_percentiles(prepared)
+
+        merged, stats = _measure(
+            ETLPipeline._merge_game_to_nbastats_team, game, pre_merge
+        )
+        extra = {}
+        if compare_reference:
+            sequential_df, sequential_stats = _measure(
+                sequential_merge_game_to_nbastats_team,
+                game,
+                {k: v.copy() for k, v in pre_merge.items()},
+            )
+            pd.testing.assert_frame_equal(sequential_df, merged, check_exact=True)
+            check_asof_merge(game, pre_merge)
+            check_team_schedule(game)
+            extra = {
+                "sequential": sequential_stats,
+                "speedup": round(
+                    sequential_stats["wall_time_s"] / stats["wall_time_s"], 2
+                ),
+            }
+        record("merge_game_to_nbastats_team", pre_merge, merged, stats, **extra)
+
+        post_merge, stats = _measure(feature_creation_post_merge, merged)
+        record("feature_creation_post_merge", merged, post_merge, stats)
+        if compare_reference:
+            check_team_history(game)
+
+        if post_merge_workers > 1:
+            sharded, stats = _measure(
+                feature_creation_post_merge, merged, post_merge_workers
+            )
+            pd.testing.assert_frame_equal(post_merge, sharded, check_exact=True)
+            record(
+                "feature_creation_post_merge_sharded",
+                merged,
+                sharded,
+                stats,
+                max_workers=post_merge_workers,
+            )
+
+        num_bytes, stats = _measure(serialize_jsonb, post_merge)
+        record("jsonb_serialization", post_merge, None, stats, payload_bytes=num_bytes)
+
+        for team_encoding in ["sparse", "codes"]:
+            encoded = feature_creation_post_merge(merged, team_encoding=team_encoding)
+            num_bytes, stats = _measure(serialize_jsonb, encoded)
+            record(
+                "jsonb_serialization",
+                encoded,
+                None,
+                stats,
+                payload_bytes=num_bytes,
+                team_encoding=team_encoding,
+            )
+
+        stats = full_rebuild_peak_memory(num_seasons, seed=seed)
+        record("full_rebuild", nbastats_team_dfs, None, stats)
+        if max_peak_ratio is not None and stats["peak_to_data"] > max_peak_ratio:
+            raise AssertionError(
+                f"Full rebuild peak memory is {stats['peak_to_data']}x the data "
+                f"for {num_seasons} seasons, above {max_peak_ratio}x"
+            )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ETL benchmarks")
+    parser.add_argument(
+        "--seasons", type=int, nargs="+", default=[1, 5, 25], help="Season counts"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic data seed")
+    parser.add_argument(
+        "--skip-reference",
+        action="store_true",
+        help="Don't run the sequential reference merge",
+    )
+    parser.add_argument(
+        "--post-merge-workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes for the season-sharded post-merge benchmark",
+    )
+    parser.add_argument(
+        "--max-peak-ratio",
+        type=float,
+        default=MAX_PEAK_RATIO,
+        help="Fail if a full rebuild peaks above this many times the data, 0 to disable",
+    )
+    parser.add_argument("--output", help="Optional path for the JSON results")
+    args = parser.parse_args()
+
+    results = benchmark_suite(
+        args.seasons,
+        seed=args.seed,
+        compare_reference=not args.skip_reference,
+        post_merge_workers=args.post_merge_workers,
+        max_peak_ratio=args.max_peak_ratio or None,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
@@ -1,22 +1,36 @@
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from multiprocessing import shared_memory
 
 import numpy as np
 import pandas as pd
+from numba import njit
 
 here = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(here, "../.."))
 sys.path.append(os.path.join(here, ".."))
 
 from config import FEATURE_TABLE_INFO
-from utils.general_utils import find_season_information
+from utils.general_utils import (
+    SEASON_CALENDAR,
+    TEAM_DTYPE,
+    apply_categorical_vocabulary,
+)
+
+from .profiling import StageProfiler
+from .team_schedule import TeamScheduleIndex
 
 
 class FeatureCreationPreMerge:
-    def __init__(self, features_tables):
+    def __init__(self, features_tables, profiler=None, transform_columns=None):
         self.features_tables = features_tables
         self.updated_features_tables = features_tables.copy()
+        self.profiler = StageProfiler(enabled=False) if profiler is None else profiler
+        # Columns to z-score and rank by table ({"zscore": [...], "percentile":
+        # [...]}), every feature column of the tables not listed
+        self.transform_columns = {} if transform_columns is None else transform_columns
 
     def full_feature_creation(self):
         for table_name in self.features_tables:
@@ -26,106 +40,160 @@ class FeatureCreationPreMerge:
                 print(f"No feature creation method for table: {table_name}")
                 continue
             else:
-                self.updated_features_tables[table_name] = method(
-                    self.features_tables[table_name]
-                )
+                df = self.features_tables[table_name]
+                with self.profiler.stage(method.__name__, df) as record:
+                    self.updated_features_tables[table_name] = method(df)
+                    record["outputs"] = self.updated_features_tables[table_name]
         return self.updated_features_tables
 
     # FEATURE CREATION METHODS
     def _create_features_team_nbastats_general_traditional(self, df):
-        table_info = FEATURE_TABLE_INFO["team_nbastats_general_traditional"]
         return self._zscore_and_percentiles(
-            df, table_info["feature_columns"], table_info["date_column"]
+            df, *self._table_transforms("team_nbastats_general_traditional")
         )
 
     def _create_features_team_nbastats_general_advanced(self, df):
-        table_info = FEATURE_TABLE_INFO["team_nbastats_general_advanced"]
         return self._zscore_and_percentiles(
-            df, table_info["feature_columns"], table_info["date_column"]
+            df, *self._table_transforms("team_nbastats_general_advanced")
         )
 
     def _create_features_team_nbastats_general_fourfactors(self, df):
-        table_info = FEATURE_TABLE_INFO["team_nbastats_general_fourfactors"]
         return self._zscore_and_percentiles(
-            df, table_info["feature_columns"], table_info["date_column"]
+            df, *self._table_transforms("team_nbastats_general_fourfactors")
         )
 
     def _create_features_team_nbastats_general_opponent(self, df):
-        table_info = FEATURE_TABLE_INFO["team_nbastats_general_opponent"]
         return self._zscore_and_percentiles(
-            df, table_info["feature_columns"], table_info["date_column"]
+            df, *self._table_transforms("team_nbastats_general_opponent")
         )
 
     # HELPER METHODS
 
-    def _zscore_and_percentiles(self, df, all_feature_cols, date_col):
-        def safe_zscore(s, ddof=1):
-            mean = s.mean()
-            std = s.std(ddof=ddof)
-            if std == 0:
-                return pd.Series([np.nan] * len(s), index=s.index)
-            return (s - mean) / std
+    def _table_transforms(self, table_name):
+        table_info = FEATURE_TABLE_INFO[table_name]
+        transforms = self.transform_columns.get(table_name, {})
+        return (
+            transforms.get("zscore", table_info["feature_columns"]),
+            transforms.get("percentile", table_info["feature_columns"]),
+            table_info["date_column"],
+        )
 
-        def safe_percentile(s):
-            return s.rank(pct=True)
+    def _zscore_and_percentiles(self, df, zscore_cols, percentile_cols, date_col):
+        """
+        Z-score and percentile of each feature within its date, for all the
+        feature columns in one grouped pass. The z-score uses the same mean
+        and std (ddof=1) as Series.mean() and Series.std() per date and is NaN
+        for the whole date when the std is 0.
+        """
+        # One stable sort by date, rows keep their order within each date
+        dates = df[date_col].to_numpy()
+        rows = np.flatnonzero(~pd.isna(dates))
+        order = rows[np.argsort(dates[rows], kind="stable")]
+        sorted_dates = dates[order]
+        group_starts = np.flatnonzero(
+            np.concatenate([[True], sorted_dates[1:] != sorted_dates[:-1], [True]])
+        )
 
-        for col in all_feature_cols:
-            df[col + "_zscore"] = (
-                df.groupby(date_col)[col].transform(safe_zscore).where(df[col].notnull())
-            )
-            df[col + "_percentile"] = (
-                df.groupby(date_col)[col]
-                .transform(safe_percentile)
-                .where(df[col].notnull())
+        # float32 features are computed in float32 like pandas, all others in float64
+        feature_dtypes = df[zscore_cols].dtypes
+        zscores = {}
+        for dtype in [np.float32, np.float64]:
+            is_dtype = (feature_dtypes == np.float32) == (dtype == np.float32)
+            cols = feature_dtypes.index[is_dtype]
+            if len(cols) == 0:
+                continue
+            values = np.ascontiguousarray(df[cols].to_numpy(dtype=dtype)[order].T)
+            sorted_zscores, zero_std = _grouped_zscores(
+                values, np.nan_to_num(values, nan=0.0), group_starts
             )
+            del values
+            for i, col in enumerate(cols):
+                # A date with std 0 gets float64 NaNs, which upcasts the column
+                col_dtype = np.float64 if zero_std[i] else dtype
+                col_zscores = np.full(len(df), np.nan, dtype=col_dtype)
+                col_zscores[order] = sorted_zscores[i]
+                zscores[col] = col_zscores
+            del sorted_zscores
+
+        percentiles = {}
+        if len(percentile_cols) > 0:
+            ranks = df.groupby(date_col)[percentile_cols].rank(pct=True)
+            percentiles = {col: ranks[col].to_numpy() for col in percentile_cols}
+
+        # The new columns are added to a shallow copy rather than concatenated,
+        # which would copy the table and hold it twice next to the new columns.
+        # The tables have few enough columns for the frame not to fragment.
+        df = df.copy(deep=False)
+        for col in dict.fromkeys(list(zscore_cols) + list(percentile_cols)):
+            if col in zscores:
+                df[col + "_zscore"] = zscores.pop(col)
+            if col in percentiles:
+                df[col + "_percentile"] = percentiles.pop(col)
 
         return df
 
 
+# Columns the per-team history features are computed from
+TEAM_HISTORY_COLUMNS = [
+    "game_datetime",
+    "season",
+    "home_team",
+    "away_team",
+    "home_score",
+    "away_score",
+    "game_completed",
+]
+
+# How the home and away teams are one-hot encoded: "dense" adds a 0/1 column
+# per team and side, "sparse" adds them as SparseDtype columns and "codes"
+# adds none, the home_team and away_team codes are expanded with
+# expand_team_codes where a model needs them
+TEAM_ENCODINGS = ["dense", "sparse", "codes"]
+
+
 class FeatureCreationPostMerge:
-    def __init__(self, combined_features):
-        self.updated_combined_features = combined_features.copy()
+    def __init__(
+        self, combined_features, profiler=None, max_workers=1, team_encoding="dense"
+    ):
+        if team_encoding not in TEAM_ENCODINGS:
+            raise ValueError(f"Unknown team encoding: {team_encoding}")
+        # Methods only add or replace whole columns, a shallow copy keeps the
+        # input unchanged without copying every feature
+        self.updated_combined_features = combined_features.copy(deep=False)
+        self.profiler = StageProfiler(enabled=False) if profiler is None else profiler
+        self.max_workers = max_workers
+        self.team_encoding = team_encoding
 
     def full_feature_creation(self):
-        self.updated_combined_features = self._add_season_timeframe_info(
-            self.updated_combined_features
-        )
-        self.updated_combined_features = self._add_day_of_season(
-            self.updated_combined_features
-        )
-        self.updated_combined_features = self._calculate_days_since_last_game(
-            self.updated_combined_features
-        )
-        self.updated_combined_features = self._calculate_team_performance_metrics(
-            self.updated_combined_features
-        )
-        self.updated_combined_features = self._encode_home_team(
-            self.updated_combined_features
-        )
-        self.updated_combined_features = self._encode_away_team(
-            self.updated_combined_features
-        )
-
-        self.updated_combined_features = self.updated_combined_features.drop(
-            columns=["reg_season_start_date"]
-        )
+        if self.max_workers > 1:
+            team_history_method = self._calculate_team_history_by_season
+        else:
+            team_history_method = self._calculate_team_history
+        methods = [
+            self._add_season_timeframe_info,
+            self._add_day_of_season,
+            team_history_method,
+        ]
+        if self.team_encoding != "codes":
+            methods.append(self._encode_teams)
+        for method in methods:
+            with self.profiler.stage(
+                method.__name__, self.updated_combined_features
+            ) as record:
+                self.updated_combined_features = method(self.updated_combined_features)
+                record["outputs"] = self.updated_combined_features
+
+        # The frame is owned here, the column is dropped without a copy
+        del self.updated_combined_features["reg_season_start_date"]
 
         return self.updated_combined_features
 
     def _add_season_timeframe_info(self, df):
-        # Convert the 'game_datetime' to a string format and apply 'find_season_information'
-        season_info_series = (
-            df["game_datetime"].dt.strftime("%Y-%m-%d").apply(find_season_information)
-        )
-
-        # Extract relevant info from the dictionaries and add as new columns
-        df["season"] = season_info_series.apply(lambda x: x["season"])
-        df["season_type"] = season_info_series.apply(lambda x: x["season_type"])
-        df["reg_season_start_date"] = season_info_series.apply(
-            lambda x: x["reg_season_start_date"]
-        )
-        df["reg_season_start_date"] = pd.to_datetime(df["reg_season_start_date"])
-        return df
+        season_info = SEASON_CALENDAR.lookup(df["game_datetime"])
+        df["season"] = season_info["season"]
+        df["season_type"] = season_info["season_type"]
+        df["reg_season_start_date"] = season_info["reg_season_start_date"]
+        return apply_categorical_vocabulary(df, ["season", "season_type"])
 
     def _add_day_of_season(self, df):
         df["day_of_season"] = (
@@ -133,213 +201,164 @@ class FeatureCreationPostMerge:
         ).dt.days + 1
         return df
 
-    def _encode_home_team(self, df):
-        dummies = pd.get_dummies(df["home_team"], prefix="home")
-        df = pd.concat([df, dummies], axis=1)
+    def _encode_teams(self, df):
+        sparse = self.team_encoding == "sparse"
+        home_dummies = pd.get_dummies(df["home_team"], prefix="home", sparse=sparse)
+        away_dummies = pd.get_dummies(df["away_team"], prefix="away", sparse=sparse)
+        return self._add_columns(df, home_dummies, away_dummies)
+
+    @staticmethod
+    def _add_columns(df, *new_dfs):
+        # One concat for all the new columns, inserting them one at a time
+        # leaves the frame fragmented into a block per column
+        return pd.concat([df, *new_dfs], axis=1)
+
+    def _calculate_team_history(self, df):
+        """
+        Days since last game and team performance metrics, computed from one
+        team schedule index of the games.
+        """
+        df.index = pd.RangeIndex(len(df))
+        schedule = TeamScheduleIndex.from_games(df)
+        df = self._calculate_days_since_last_game(df, schedule)
+        df = self._calculate_team_performance_metrics(df, schedule)
+        return self._sort_by_season(df)
+
+    @staticmethod
+    def _sort_by_season(df):
+        # Same order as sort_values(["season", "game_datetime"]), the rows are
+        # only copied if they aren't in that order already
+        keys = df[["season", "game_datetime"]].reset_index(drop=True)
+        order = keys.sort_values(["season", "game_datetime"]).index.to_numpy()
+        if (order != np.arange(len(order))).any():
+            df = df.take(order)
         return df
 
-    def _encode_away_team(self, df):
-        dummies = pd.get_dummies(df["away_team"], prefix="away")
-        df = pd.concat([df, dummies], axis=1)
-        return df
-
-    def _calculate_days_since_last_game(self, df):
-        # Create two copies of the dataframe, one for home games, one for away games
-        home_df = df[["game_datetime", "season", "home_team"]].rename(
-            columns={"home_team": "team"}
-        )
-        away_df = df[["game_datetime", "season", "away_team"]].rename(
-            columns={"away_team": "team"}
-        )
-
-        # Concatenate along the row axis (i.e., append the dataframes one below the other)
-        all_games_df = pd.concat([home_df, away_df], axis=0)
-
-        # Sort the dataframe by team and date
-        all_games_df.sort_values(["team", "game_datetime"], inplace=True)
-
-        # Initialize an empty list to store the intermediate dataframes
-        df_list = []
-
-        # Loop over each season
-        for season in all_games_df["season"].unique():
-            # Filter the dataframe for the current season
-            season_df = all_games_df[all_games_df["season"] == season].copy()
-
-            # Calculate the days since the last game for each team
-            season_df["days_since_last_game"] = (
-                season_df.groupby("team")["game_datetime"].diff().dt.days
-            )
-
-            # Append the results to the df_list
-            df_list.append(season_df)
-
-        # Concatenate all the intermediate dataframes in df_list into a single dataframe
-        df_result = pd.concat(df_list, axis=0)
-
-        # Merge the original dataframe with the result dataframe
-        df = pd.merge(
-            df,
-            df_result,
-            how="left",
-            left_on=["game_datetime", "season", "home_team"],
-            right_on=["game_datetime", "season", "team"],
+    def _calculate_team_history_by_season(self, df):
+        """
+        Days since last game and team performance metrics with seasons computed
+        in parallel. Both reset at the start of each season, so every season is
+        sent to a process pool on its own. Only the columns they are computed
+        from are shared with the workers, as numeric arrays in shared memory,
+        and the new columns are put back in the same row order as the
+        sequential methods return.
+        """
+        df.index = pd.RangeIndex(len(df))
+        team_codes, _ = pd.factorize(
+            pd.concat([df["home_team"], df["away_team"]], ignore_index=True)
         )
-        df = pd.merge(
-            df,
-            df_result,
-            how="left",
-            left_on=["game_datetime", "season", "away_team"],
-            right_on=["game_datetime", "season", "team"],
-            suffixes=("_home", "_away"),
+        season_codes, season_names = pd.factorize(df["season"])
+        arrays = {
+            "game_datetime": df["game_datetime"].to_numpy(dtype="datetime64[ns]"),
+            "season": season_codes,
+            "home_team": team_codes[: len(df)],
+            "away_team": team_codes[len(df) :],
+            "home_score": df["home_score"].to_numpy(dtype=np.float64),
+            "away_score": df["away_score"].to_numpy(dtype=np.float64),
+            "game_completed": df["game_completed"].to_numpy(dtype=bool),
+        }
+
+        shards = [
+            np.flatnonzero(season_codes == code) for code in range(len(season_names))
+        ]
+        blocks = {}
+        try:
+            for col, values in arrays.items():
+                blocks[col] = shared_memory.SharedMemory(
+                    create=True, size=max(values.nbytes, 1)
+                )
+                np.ndarray(values.shape, values.dtype, buffer=blocks[col].buf)[
+                    :
+                ] = values
+            specs = {
+                col: (blocks[col].name, values.shape, values.dtype.str)
+                for col, values in arrays.items()
+            }
+            with ProcessPoolExecutor(
+                max_workers=min(self.max_workers, max(len(shards), 1))
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _team_history_for_shard,
+                        [specs] * len(shards),
+                        shards,
+                    )
+                )
+        finally:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+
+        history_columns = results[0][1] if results else []
+        history = np.full((len(df), len(history_columns)), np.nan)
+        for positions, _, values in results:
+            history[positions] = values
+        df = self._add_columns(
+            df, pd.DataFrame(history, columns=history_columns, index=df.index)
         )
-
-        # Drop the unnecessary 'team' columns
-        df.drop(columns=["team_home", "team_away"], inplace=True)
+        return self._sort_by_season(df)
+
+    def _calculate_days_since_last_game(self, df, schedule):
+        # Games of each team are consecutive in the schedule, the first game of
+        # every team-season has no previous game
+        days = schedule.days_since_previous_game()
+        (
+            df["days_since_last_game_home"],
+            df["days_since_last_game_away"],
+        ) = schedule.to_games(days)
         df["rest_diff_hv"] = (
             df["days_since_last_game_home"] - df["days_since_last_game_away"]
         )
         return df
 
-    def _calculate_team_performance_metrics(self, inbound_df):
-        df = inbound_df.copy()
-        df.sort_values(["season", "game_datetime"], inplace=True)
-
-        # initializing new columns
-        metrics_columns = [
-            "home_team_last_5_games_result",
-            "away_team_last_5_games_result",
-            "home_team_streak",
-            "away_team_streak",
-            "home_team_win_pct",
-            "away_team_win_pct",
-            "home_team_avg_point_diff",
-            "away_team_avg_point_diff",
-            "home_team_avg_point_diff_last_5",
-            "away_team_avg_point_diff_last_5",
-        ]
-        for col in metrics_columns:
-            df[col] = np.nan
-
-        # Loop through each season
-        # Metrics reset at the beginning of each season
-        # print(df.info(verbose=True, max_cols=1000, show_counts=True))
-        for season in df["season"].unique():
-            season_df = df.loc[df["season"] == season].copy()
-
-            # Loop through each team
-            # Metrics are calculated for each team
-            for team in pd.concat(
-                [season_df["home_team"], season_df["away_team"]]
-            ).unique():
-                mask = (season_df["home_team"] == team) | (
-                    season_df["away_team"] == team
-                )
-                team_df = season_df[mask].copy()
-                team_df["team"] = team
-
-                # Calculate the win/loss performance of the team in each game
-                conditions = [
-                    (~team_df["game_completed"]),
-                    (
-                        (team_df["home_team"] == team)
-                        & (team_df["home_score"] > team_df["away_score"])
-                    ),
-                    (
-                        (team_df["away_team"] == team)
-                        & (team_df["away_score"] > team_df["home_score"])
-                    ),
-                    (
-                        (team_df["home_team"] == team)
-                        & (team_df["home_score"] < team_df["away_score"])
-                    ),
-                    (
-                        (team_df["away_team"] == team)
-                        & (team_df["away_score"] < team_df["home_score"])
-                    ),
-                ]
-
-                choices = [0, 1, 1, -1, -1]
-
-                team_df["performance"] = np.select(conditions, choices, default=np.nan)
-
-                # Calculate the results of the last 5 games (excluding current game),
-                # with a value even if there are fewer than 5 previous games.
-                # Fill NaN with 0 for no prior games.
-                team_df["last_5_games_result"] = (
-                    team_df["performance"]
-                    .rolling(window=5, min_periods=1)
-                    .sum()
-                    .shift(1)
-                    .fillna(0)
-                )
-
-                # Initialize an empty list to store the streaks
-                streaks = []
-
-                # Initialize streak for the team
-                current_streak = 0
-
-                # Loop through each game for the team
-                for i, row in team_df.iterrows():
-                    # Append the current streak to the list
-                    streaks.append(current_streak)
-
-                    # Update the streak based on the game outcome
-                    performance = row["performance"]
-
-                    if (
-                        performance == 0
-                    ):  # If game is in progress, skip updating the streak
-                        continue
-
-                    if current_streak == 0:
-                        current_streak = performance
-                    elif np.sign(current_streak) == np.sign(performance):
-                        current_streak += performance
-                    else:
-                        current_streak = performance
-
-                # Add the calculated streaks to the DataFrame
-                team_df["streak"] = streaks
-
-                # Calculate win percentage (excluding current game)
-                team_df["win_pct"] = team_df["performance"].expanding().mean().shift(1)
-
-                # Calculate point differential
-                team_df["point_diff"] = np.where(
-                    team_df["home_team"] == team,
-                    team_df["home_score"] - team_df["away_score"],
-                    team_df["away_score"] - team_df["home_score"],
-                )
-
-                # Compute the average point differential over all games (excluding current game)
-                team_df["avg_point_diff"] = (
-                    team_df["point_diff"].expanding().mean().shift(1).fillna(0)
-                )
-
-                # Compute the average point differential over the last 5 games (excluding current game)
-                team_df["avg_point_diff_last_5"] = (
-                    team_df["point_diff"].rolling(window=5).mean().shift(1).fillna(0)
-                )
-
-                # Update the main dataframe with the calculated metrics
-                update_cols = [
-                    "last_5_games_result",
-                    "streak",
-                    "win_pct",
-                    "avg_point_diff",
-                    "avg_point_diff_last_5",
-                ]
-
-                for col in update_cols:
-                    # For home team
-                    home_mask = (df["home_team"] == team) & mask
-                    df.loc[home_mask, f"home_team_{col}"] = team_df.loc[home_mask, col]
-
-                    # For away team
-                    away_mask = (df["away_team"] == team) & mask
-                    df.loc[away_mask, f"away_team_{col}"] = team_df.loc[away_mask, col]
+    def _calculate_team_performance_metrics(self, df, schedule):
+        home_score = df["home_score"].to_numpy(dtype=np.float64)
+        away_score = df["away_score"].to_numpy(dtype=np.float64)
+        game_completed = df["game_completed"].to_numpy(dtype=bool)
+        team_score = schedule.from_sides(home_score, away_score)
+        opponent_score = schedule.from_sides(away_score, home_score)
+        game_completed = schedule.from_sides(game_completed, game_completed)
+
+        # Win/loss performance of the team in each game
+        performance = np.select(
+            [~game_completed, team_score > opponent_score, team_score < opponent_score],
+            [0, 1, -1],
+            default=np.nan,
+        )
+        point_diff = team_score - opponent_score
+
+        # Metrics reset at the beginning of each season, the schedule index
+        # keeps each (season, team) pair in its own segment of games
+        metrics = {
+            # Results of the last 5 games (excluding current game), with a value
+            # even if there are fewer than 5 previous games. 0 for no prior games.
+            "last_5_games_result": self._fill_nan(
+                schedule.shift(
+                    schedule.rolling_sum(performance, 5, min_periods=1),
+                ),
+                0,
+            ),
+            "streak": schedule.streaks(performance),
+            # Win percentage (excluding current game)
+            "win_pct": schedule.shift(schedule.expanding_mean(performance)),
+            # Average point differential over all games (excluding current game)
+            "avg_point_diff": self._fill_nan(
+                schedule.shift(schedule.expanding_mean(point_diff)), 0
+            ),
+            # Average point differential over the last 5 games (excluding current game)
+            "avg_point_diff_last_5": self._fill_nan(
+                schedule.shift(
+                    schedule.rolling_sum(point_diff, 5, min_periods=5) / 5,
+                ),
+                0,
+            ),
+        }
+
+        # Map the team-game metrics back to the home and away side of each game
+        for col, long_values in metrics.items():
+            home_values, away_values = schedule.to_games(long_values)
+            df[f"home_team_{col}"] = home_values
+            df[f"away_team_{col}"] = away_values
 
         # Compute the "home view" metrics
         df["last_5_hv"] = (
@@ -351,11 +370,177 @@ class FeatureCreationPostMerge:
             df["home_team_avg_point_diff"] - df["away_team_avg_point_diff"]
         )
         df["point_diff_last_5_hv"] = (
-            df["home_team_avg_point_diff_last_5"] - df["away_team_avg_point_diff_last_5"]
+            df["home_team_avg_point_diff_last_5"]
+            - df["away_team_avg_point_diff_last_5"]
         )
 
         return df
 
+    @staticmethod
+    def _fill_nan(values, fill_value):
+        return np.where(np.isnan(values), fill_value, values)
+
+
+def expand_team_codes(df):
+    """
+    Adds the one-hot home_<team> and away_<team> columns of the dense team
+    encoding to a copy of df, from its home_team and away_team columns. Every
+    team of the vocabulary gets a column, so features built with
+    team_encoding="codes" expand to the same model input as the dense ones.
+    """
+    dummies = []
+    for side in ["home", "away"]:
+        teams = df[f"{side}_team"].astype(TEAM_DTYPE)
+        unknown = df[f"{side}_team"].notna() & teams.isna()
+        if unknown.any():
+            raise ValueError(
+                f"Values of {side}_team not in its vocabulary: {sorted(df.loc[unknown, f'{side}_team'].unique())}"
+            )
+        dummies.append(pd.get_dummies(teams, prefix=side))
+    return FeatureCreationPostMerge._add_columns(df, *dummies)
+
+
+def _team_history_for_shard(specs, positions):
+    """
+    Process pool worker of _calculate_team_history_by_season: builds the team
+    schedule of the games at positions from shared memory and returns their
+    positions, the names and the values of the team history columns.
+    """
+    columns = {}
+    for col, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            columns[col] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)[
+                positions
+            ]
+        finally:
+            block.close()
+
+    schedule = TeamScheduleIndex(
+        columns["game_datetime"],
+        columns["season"],
+        columns["home_team"],
+        columns["away_team"],
+    )
+    shard = pd.DataFrame(
+        {
+            "home_score": columns["home_score"],
+            "away_score": columns["away_score"],
+            "game_completed": columns["game_completed"],
+        }
+    )
+
+    feature_creation = FeatureCreationPostMerge(shard)
+    shard = feature_creation._calculate_days_since_last_game(shard, schedule)
+    shard = feature_creation._calculate_team_performance_metrics(shard, schedule)
+    history_columns = [col for col in shard.columns if col not in TEAM_HISTORY_COLUMNS]
+    return (
+        positions,
+        history_columns,
+        shard[history_columns].to_numpy(dtype=np.float64),
+    )
+
+
+@njit(cache=True)
+def _pairwise_sum(values, row, start, n):
+    """
+    Sum of values[row, start:start + n] in the same order as NumPy's pairwise
+    summation, so float32 sums match Series.mean() bit for bit.
+    """
+    if n < 8:
+        total = np.zeros(1, dtype=values.dtype)[0]
+        for i in range(start, start + n):
+            total += values[row, i]
+        return total
+    elif n <= 128:
+        r0 = values[row, start]
+        r1 = values[row, start + 1]
+        r2 = values[row, start + 2]
+        r3 = values[row, start + 3]
+        r4 = values[row, start + 4]
+        r5 = values[row, start + 5]
+        r6 = values[row, start + 6]
+        r7 = values[row, start + 7]
+        i = 8
+        while i < n - (n % 8):
+            j = start + i
+            r0 += values[row, j]
+            r1 += values[row, j + 1]
+            r2 += values[row, j + 2]
+            r3 += values[row, j + 3]
+            r4 += values[row, j + 4]
+            r5 += values[row, j + 5]
+            r6 += values[row, j + 6]
+            r7 += values[row, j + 7]
+            i += 8
+        total = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+        while i < n:
+            total += values[row, start + i]
+            i += 1
+        return total
+    else:
+        n2 = n // 2
+        n2 -= n2 % 8
+        return _pairwise_sum(values, row, start, n2) + _pairwise_sum(
+            values, row, start + n2, n - n2
+        )
+
+
+@njit(cache=True)
+def _grouped_zscores(values, filled_values, group_starts):
+    """
+    Z-scores of each row of values (features x rows sorted by group) within
+    each group. The mean follows pandas' nanmean (pairwise sum with NaN as 0
+    over the non-NaN count) and the std follows Bottleneck's nanstd with ddof=1
+    (two naive passes), both in the dtype of values. Groups with std 0 are NaN
+    and flagged per feature.
+    """
+    zscores = np.empty_like(values)
+    zero_std = np.zeros(values.shape[0], dtype=np.bool_)
+    # Scalars and counts are kept in the dtype of values, mixing in float64
+    # would change the float32 results
+    zero = np.zeros(1, dtype=values.dtype)[0]
+    nan = np.full(1, np.nan, dtype=values.dtype)[0]
+    counts = np.empty(2, dtype=values.dtype)
+    for row in range(values.shape[0]):
+        for g in range(group_starts.shape[0] - 1):
+            start = group_starts[g]
+            end = group_starts[g + 1]
+
+            total = zero
+            count = 0
+            for i in range(start, end):
+                value = values[row, i]
+                if not np.isnan(value):
+                    total += value
+                    count += 1
+            counts[0] = count
+            counts[1] = count - 1
+
+            if count > 0:
+                mean = _pairwise_sum(filled_values, row, start, end - start) / counts[0]
+            else:
+                mean = nan
+            if count > 1:
+                std_mean = total / counts[0]
+                total = zero
+                for i in range(start, end):
+                    value = values[row, i]
+                    if not np.isnan(value):
+                        value -= std_mean
+                        total += value * value
+                std = np.sqrt(total / counts[1])
+            else:
+                std = nan
+
+            if std == 0:
+                zero_std[row] = True
+                zscores[row, start:end] = np.nan
+            else:
+                for i in range(start, end):
+                    zscores[row, i] = (values[row, i] - mean) / std
+    return zscores, zero_std
+
 
 if __name__ == "__main__":
     pass
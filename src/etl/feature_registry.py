@@ -0,0 +1,148 @@
+import os
+import sys
+
+here = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(here, "../.."))
+
+import config
+
+# How the combined features are derived. nbastats features are named
+# <column>[_<transform>]_<side>_<game set>_<table suffix>, the transforms are
+# computed per snapshot date before the merge (FeatureCreationPreMerge)
+NBASTATS_TRANSFORMS = ["zscore", "percentile"]
+SIDES = ["home", "away"]
+GAME_SETS = ["all", "l2w"]
+
+# Columns of the games table kept in every output
+GAME_COLUMNS = [
+    "game_id",
+    "game_datetime",
+    "home_team",
+    "away_team",
+    "open_line",
+    "home_score",
+    "away_score",
+    "game_completed",
+]
+
+# Post-merge columns by the FeatureCreationPostMerge step that adds them
+TEAM_PERFORMANCE_METRICS = [
+    "last_5_games_result",
+    "streak",
+    "win_pct",
+    "avg_point_diff",
+    "avg_point_diff_last_5",
+]
+POST_MERGE_COLUMNS = {
+    "season_timeframe": ["season", "season_type"],
+    "day_of_season": ["day_of_season"],
+    "days_since_last_game": [
+        "days_since_last_game_home",
+        "days_since_last_game_away",
+        "rest_diff_hv",
+    ],
+    "team_performance": [
+        f"{side}_team_{metric}" for metric in TEAM_PERFORMANCE_METRICS for side in SIDES
+    ]
+    + ["last_5_hv", "streak_hv", "win_pct_hv", "point_diff_hv", "point_diff_last_5_hv"],
+    "team_encoding": [
+        f"{side}_{team}"
+        for side in SIDES
+        for team in sorted(config.VALID_TEAM_ABBREVIATIONS)
+    ],
+}
+
+
+class FeatureRegistry:
+    """
+    Every column the ETL can output with what it is derived from: source
+    (games or an nbastats table), column, transform, side and game set. plan
+    turns a list of features into the minimal work to build them.
+    """
+
+    def __init__(self, table_names, feature_table_info=config.FEATURE_TABLE_INFO):
+        self.table_names = list(table_names)
+        self.feature_table_info = feature_table_info
+        self.features = {}
+        for col in GAME_COLUMNS:
+            self.features[col] = {"source": "games", "column": col}
+        for step, columns in POST_MERGE_COLUMNS.items():
+            for col in columns:
+                self.features[col] = {"source": "games", "step": step}
+
+        for table_name in self.table_names:
+            table_suffix = table_name.split("_")[-1]
+            for col in feature_table_info[table_name]["feature_columns"]:
+                for transform in [None] + NBASTATS_TRANSFORMS:
+                    name = col if transform is None else f"{col}_{transform}"
+                    for side in SIDES:
+                        for game_set in GAME_SETS:
+                            self.features[
+                                f"{name}_{side}_{game_set}_{table_suffix}"
+                            ] = {
+                                "source": table_name,
+                                "column": col,
+                                "transform": transform,
+                                "side": side,
+                                "game_set": game_set,
+                            }
+
+    def describe(self, feature):
+        try:
+            return self.features[feature]
+        except KeyError:
+            raise ValueError(f"Unknown feature: {feature}")
+
+    def plan(self, features):
+        """
+        Upstream work for the given features: for every nbastats table they
+        use, the columns to load and the columns to z-score and rank, and the
+        combined feature columns to build. Tables they don't use are left out.
+        """
+        unknown_features = [
+            feature for feature in features if feature not in self.features
+        ]
+        if unknown_features:
+            raise ValueError(f"Unknown features: {unknown_features}")
+
+        tables = {}
+        for feature in features:
+            spec = self.features[feature]
+            if spec["source"] == "games":
+                continue
+            table_plan = tables.setdefault(
+                spec["source"],
+                {"columns": [], "zscore": [], "percentile": []},
+            )
+            if spec["column"] not in table_plan["columns"]:
+                table_plan["columns"].append(spec["column"])
+            if (
+                spec["transform"] is not None
+                and spec["column"] not in table_plan[spec["transform"]]
+            ):
+                table_plan[spec["transform"]].append(spec["column"])
+
+        # Tables and columns in their configured order
+        plan_tables = {}
+        for table_name in self.table_names:
+            if table_name not in tables:
+                continue
+            feature_columns = self.feature_table_info[table_name]["feature_columns"]
+            plan_tables[table_name] = {
+                key: [col for col in feature_columns if col in columns]
+                for key, columns in tables[table_name].items()
+            }
+
+        return {
+            "tables": plan_tables,
+            "columns": GAME_COLUMNS
+            + [
+                feature
+                for feature in dict.fromkeys(features)
+                if feature not in GAME_COLUMNS
+            ],
+        }
+
+
+if __name__ == "__main__":
+    pass
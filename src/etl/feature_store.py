@@ -0,0 +1,200 @@
+import os
+import sys
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+here = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(here, "../.."))
+
+import config
+
+from .feature_registry import FeatureRegistry
+
+load_dotenv()
+FEATURE_STORE_DIR = os.getenv(
+    "FEATURE_STORE_DIR", os.path.join(here, "../../data/feature_store")
+)
+
+PARTITIONING = ds.partitioning(pa.schema([("season", pa.string())]), flavor="hive")
+
+# Stored type of the features by what they are derived from (FeatureRegistry),
+# the same in every partition whatever the dtypes of the written frame. All
+# other features are float64: scores are integers until a season has upcoming
+# games, and downcasting picks float32 or float64 per column and write.
+GAME_COLUMN_TYPES = {
+    "game_id": pa.string(),
+    "game_datetime": pa.timestamp("ns"),
+    "home_team": pa.string(),
+    "away_team": pa.string(),
+    "open_line": pa.float64(),
+    "home_score": pa.float64(),
+    "away_score": pa.float64(),
+    "game_completed": pa.bool_(),
+}
+POST_MERGE_STEP_TYPES = {
+    "season_timeframe": pa.string(),
+    "team_encoding": pa.uint8(),
+}
+
+
+class ParquetFeatureStore:
+    """
+    Local copy of the combined features as a Parquet dataset with one hive
+    partition per season (season=2023-2024/features.parquet). Rows are keyed
+    by game_id, writes replace existing games and keep the others. Readers
+    can project columns and filter seasons or dates without loading the rest.
+    """
+
+    def __init__(self, root_dir=FEATURE_STORE_DIR, feature_table_info=None):
+        self.root_dir = os.path.abspath(root_dir)
+        if feature_table_info is None:
+            feature_table_info = config.FEATURE_TABLE_INFO
+        self.registry = FeatureRegistry(
+            list(feature_table_info), feature_table_info=feature_table_info
+        )
+
+    def feature_type(self, feature):
+        """Stored Arrow type of a feature, None if it isn't in the registry."""
+        spec = self.registry.features.get(feature)
+        if spec is None:
+            return None
+        if spec["source"] != "games":
+            return pa.float64()
+        if "step" in spec:
+            return POST_MERGE_STEP_TYPES.get(spec["step"], pa.float64())
+        return GAME_COLUMN_TYPES[feature]
+
+    def target_schema(self, schema):
+        """
+        schema with the stored type of every registered feature, the columns
+        the registry doesn't know keep their type.
+        """
+        return pa.schema(
+            [
+                pa.field(field.name, self.feature_type(field.name) or field.type)
+                for field in schema
+            ]
+        )
+
+    def _cast_to_schema(self, table):
+        return table.cast(self.target_schema(table.schema))
+
+    def _partition_path(self, season):
+        return os.path.join(self.root_dir, f"season={season}", "features.parquet")
+
+    def seasons(self):
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(
+            name.split("=", 1)[1]
+            for name in os.listdir(self.root_dir)
+            if name.startswith("season=")
+            and os.path.exists(self._partition_path(name.split("=", 1)[1]))
+        )
+
+    def write(self, df):
+        """
+        Upserts the rows of df (with game_id, game_datetime and season columns)
+        into their season partitions. Each touched partition is rewritten
+        atomically. Rows are cast to the stored feature types, and the existing
+        rows of a partition are widened to them before being merged. Returns
+        the number of rows written per season.
+        """
+        try:
+            rows_written = {}
+            for season, season_df in df.groupby("season", sort=True, observed=True):
+                path = self._partition_path(season)
+                season_df = season_df.drop(columns=["season"])
+                # Parquet has no sparse type, sparse columns are stored dense
+                for col, dtype in season_df.dtypes.items():
+                    if isinstance(dtype, pd.SparseDtype):
+                        season_df[col] = season_df[col].sparse.to_dense()
+
+                table = self._cast_to_schema(
+                    pa.Table.from_pandas(season_df, preserve_index=False)
+                )
+
+                if os.path.exists(path):
+                    existing_table = pq.read_table(path)
+                    existing_table = existing_table.filter(
+                        pc.invert(
+                            pc.is_in(
+                                existing_table["game_id"], value_set=table["game_id"]
+                            )
+                        )
+                    )
+                    # Columns missing from either side are null
+                    table = pa.concat_tables(
+                        [self._cast_to_schema(existing_table), table], promote=True
+                    )
+
+                table = table.sort_by(
+                    [("game_datetime", "ascending"), ("game_id", "ascending")]
+                )
+
+                # Write next to the partition and swap, readers never see a partial file
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                pq.write_table(table, temp_path)
+                os.replace(temp_path, path)
+                rows_written[season] = table.num_rows
+            return rows_written
+        except Exception as e:
+            print("\n*** Error Writing Features to Parquet Feature Store")
+            raise e
+
+    def schema(self, seasons=None):
+        """
+        Unified schema over the requested season partitions, columns added in
+        later seasons are included and read as nulls for earlier ones.
+        Registered features have their stored type, partitions written with
+        other types are cast to it when read.
+        """
+        seasons = self.seasons() if seasons is None else seasons
+        schemas = [
+            self.target_schema(pq.read_schema(self._partition_path(season)))
+            for season in seasons
+            if os.path.exists(self._partition_path(season))
+        ]
+        if not schemas:
+            raise ValueError(f"No feature store partitions found in {self.root_dir}")
+        schema = pa.unify_schemas(schemas).remove_metadata()
+        return schema.append(pa.field("season", pa.string()))
+
+    def read(self, columns=None, seasons=None, start_date=None, end_date=None):
+        """
+        Features as a DataFrame, optionally only the given columns, seasons and
+        game_datetime range (start_date inclusive, end_date exclusive).
+        """
+        seasons = self.seasons() if seasons is None else list(seasons)
+        schema = self.schema(seasons)
+        dataset = ds.dataset(
+            [self._partition_path(season) for season in seasons],
+            schema=schema,
+            format="parquet",
+            partitioning=PARTITIONING,
+            partition_base_dir=self.root_dir,
+        )
+
+        filter_expression = None
+        if start_date is not None:
+            filter_expression = ds.field("game_datetime") >= pd.Timestamp(start_date)
+        if end_date is not None:
+            end_expression = ds.field("game_datetime") < pd.Timestamp(end_date)
+            if filter_expression is None:
+                filter_expression = end_expression
+            else:
+                filter_expression = filter_expression & end_expression
+
+        table = dataset.to_table(columns=columns, filter=filter_expression)
+        return table.to_pandas()
+
+
+if __name__ == "__main__":
+    pass
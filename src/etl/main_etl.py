@@ -1,20 +1,59 @@
-import json
+import gc
+import hashlib
+import io
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
 import pytz
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-
-from .feature_creation import FeatureCreationPostMerge, FeatureCreationPreMerge
+from sqlalchemy import (
+    Boolean,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    create_engine,
+    text,
+)
+
+from .checkpoints import (
+    CHECKPOINT_DIR,
+    StageCheckpointer,
+    code_fingerprint,
+    data_fingerprint,
+)
+from .feature_creation import (
+    TEAM_ENCODINGS,
+    FeatureCreationPostMerge,
+    FeatureCreationPreMerge,
+    _grouped_zscores,
+    _pairwise_sum,
+    _team_history_for_shard,
+)
+from .feature_registry import FeatureRegistry
+from .feature_store import FEATURE_STORE_DIR, ParquetFeatureStore
+from .profiling import StageProfiler
+from .team_schedule import TeamScheduleIndex, _team_streaks
 
 here = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(here, "../.."))
 
 import config
+from src.database_orm import Base
+from src.utils.general_utils import (
+    SEASON_CALENDAR,
+    TEAM_DTYPE,
+    SeasonCalendar,
+    apply_categorical_vocabulary,
+    find_season_information,
+)
 
 load_dotenv()
 DB_ENDPOINT = os.getenv("DB_ENDPOINT")
@@ -24,6 +63,69 @@ pd.set_option("display.max_columns", 200)
 pd.set_option("display.max_rows", None)
 pd.set_option("display.width", None)
 
+NBASTATS_TEAM_TABLES = [
+    "team_nbastats_general_traditional",
+    "team_nbastats_general_advanced",
+    "team_nbastats_general_fourfactors",
+    "team_nbastats_general_opponent",
+]
+
+# Merge of the nbastats snapshots to games: "exact" uses the snapshot through
+# the day before the game, "asof" the latest one before the game up to
+# NBASTATS_MAX_STALENESS_DAYS days older, for days the spider missed
+NBASTATS_MERGE_MODES = ["exact", "asof"]
+NBASTATS_MAX_STALENESS_DAYS = 3
+
+# Incremental runs re-read the feature tables this many days behind their
+# watermark, since the spider re-scrapes older snapshots in place and the
+# watermark, MAX of the date column, doesn't move when it does
+WATERMARK_LOOKBACK_DAYS = 7
+
+JSONB_STAGING_TABLE = "all_features_json_staging"
+JSONB_COPY_CHUNK_SIZE = 5000
+LOAD_CHUNK_SIZE = 50000
+
+# Typed copy of the combined features, one column per feature
+FEATURES_TABLE = "all_features"
+FEATURES_STAGING_TABLE = "all_features_staging"
+POSTGRES_MAX_COLUMNS = 1600
+POSTGRES_MAX_IDENTIFIER_LENGTH = 63
+
+# Postgres column type by pandas dtype kind and size, integer and float types
+# are listed from narrowest to widest so existing columns are only ever widened
+POSTGRES_INTEGER_TYPES = {1: "smallint", 2: "smallint", 4: "integer", 8: "bigint"}
+POSTGRES_INTEGER_ORDER = ["smallint", "integer", "bigint"]
+POSTGRES_FLOAT_ORDER = ["real", "double precision"]
+# Column type of object columns by pandas.api.types.infer_dtype, all-null
+# columns ("empty") keep the type the table declares
+POSTGRES_INFERRED_TYPES = {
+    "boolean": "boolean",
+    "integer": "bigint",
+    "floating": "double precision",
+    "mixed-integer-float": "double precision",
+    "datetime64": "timestamp without time zone",
+    "datetime": "timestamp without time zone",
+    "empty": None,
+}
+
+# Dtypes of streamed chunks by ORM column type, the same in every chunk
+ORM_PANDAS_DTYPES = {
+    Float: "float64",
+    Integer: "Int64",
+    Boolean: "boolean",
+    String: "object",
+    Date: "datetime64[ns]",
+    DateTime: "datetime64[ns]",
+}
+ORM_ARROW_TYPES = {
+    Float: pa.float64(),
+    Integer: pa.int64(),
+    Boolean: pa.bool_(),
+    String: pa.string(),
+    Date: pa.date32(),
+    DateTime: pa.timestamp("ns"),
+}
+
 
 class ETLPipeline:
     def __init__(
@@ -32,34 +134,743 @@ class ETLPipeline:
         DB_ENDPOINT=DB_ENDPOINT,
         DB_PASSWORD=DB_PASSWORD,
         config=config,
+        incremental=False,
+        feature_tables=NBASTATS_TEAM_TABLES,
+        max_workers=1,
+        feature_store_dir=FEATURE_STORE_DIR,
+        post_merge_workers=1,
+        merge_mode="exact",
+        max_staleness_days=NBASTATS_MAX_STALENESS_DAYS,
+        serving_features=None,
+        team_encoding="dense",
+        watermark_lookback_days=WATERMARK_LOOKBACK_DAYS,
     ):
+        if merge_mode not in NBASTATS_MERGE_MODES:
+            raise ValueError(f"Unknown merge mode: {merge_mode}")
+        if team_encoding not in TEAM_ENCODINGS:
+            raise ValueError(f"Unknown team encoding: {team_encoding}")
+        # One pooled connection per worker for concurrent table loads
         self.database_engine = create_engine(
-            f"postgresql://postgres:{DB_PASSWORD}@{DB_ENDPOINT}/nba_betting"
+            f"postgresql://postgres:{DB_PASSWORD}@{DB_ENDPOINT}/nba_betting",
+            pool_size=max(5, max_workers),
+        )
+        self.max_workers = max_workers
+        # Processes for post-merge feature creation, one season per task
+        self.post_merge_workers = post_merge_workers
+        self.merge_mode = merge_mode
+        self.max_staleness_days = max_staleness_days
+        # How the home and away teams are one-hot encoded, see TEAM_ENCODINGS
+        self.team_encoding = team_encoding
+        self.feature_store = (
+            None
+            if feature_store_dir is None
+            else ParquetFeatureStore(feature_store_dir)
         )
+        self.profiler = StageProfiler(enabled=False)
         self.config = config
         self.start_date = start_date
+        self.game_start_date = start_date
+        # Exclusive end of the loaded data, None loads through today
+        self.end_date = None
+        self.incremental = incremental
+        self.feature_tables = feature_tables
+        # Serving mode only builds the features the deployed models use
+        self.serving_features = serving_features
+        self.feature_plan = None
+        if serving_features is not None:
+            registry = FeatureRegistry(feature_tables)
+            self.feature_plan = registry.plan(serving_features)
+            self.feature_tables = list(self.feature_plan["tables"])
+            team_columns = [
+                feature
+                for feature in serving_features
+                if registry.describe(feature).get("step") == "team_encoding"
+            ]
+            if team_encoding == "codes" and team_columns:
+                raise ValueError(
+                    f"Team columns aren't built with team_encoding='codes', expand them with expand_team_codes: {team_columns}"
+                )
+        self.watermarks = {}
+        self.new_watermarks = {}
+        self.watermark_lookback_days = watermark_lookback_days
+        self.changed_game_ids = None
+        self.affected_from_date = None
+        self.games_to_update = None
+        if self.incremental:
+            self._set_incremental_window()
         self.game_data = self.load_game_data()
+        if self.incremental:
+            self._find_games_to_update()
         self.features_data = {}
         self.combined_features = None
 
+    # PIPELINE RUNNER
+
+    def _stages(self):
+        # (name, function, attributes it outputs, code its result depends on)
+        return [
+            (
+                "load",
+                lambda: self.load_features_data(self.feature_tables),
+                ["game_data", "features_data"],
+                [
+                    ETLPipeline.load_features_data,
+                    ETLPipeline._load_feature_table,
+                    ETLPipeline._feature_start_date,
+                    ETLPipeline.load_table,
+                    ETLPipeline.iter_table_chunks,
+                    ETLPipeline._rows_to_frame,
+                    ETLPipeline._read_sql_values,
+                    FeatureRegistry,
+                ],
+            ),
+            (
+                "prepare",
+                self.prepare_all_tables,
+                ["features_data"],
+                [
+                    ETLPipeline._prepare_table,
+                    ETLPipeline._standardize_teams_in_dataframe,
+                    ETLPipeline._check_duplicates,
+                    ETLPipeline.standardize_team_names,
+                    ETLPipeline.check_duplicates,
+                    ETLPipeline._duplicated_rows,
+                    ETLPipeline._row_hashes,
+                    ETLPipeline.downcast_data_types,
+                ],
+            ),
+            (
+                "pre_merge",
+                self.feature_creation_pre_merge,
+                ["features_data"],
+                [FeatureCreationPreMerge, _grouped_zscores, _pairwise_sum],
+            ),
+            (
+                "merge",
+                self.merge_features_data,
+                ["combined_features"],
+                [
+                    ETLPipeline.merge_features_data,
+                    ETLPipeline._merge_game_to_nbastats_team,
+                    ETLPipeline._asof_snapshot_positions,
+                ],
+            ),
+            (
+                "post_merge",
+                self.feature_creation_post_merge,
+                ["combined_features"],
+                [
+                    FeatureCreationPostMerge,
+                    _team_history_for_shard,
+                    TeamScheduleIndex,
+                    _team_streaks,
+                    SeasonCalendar,
+                ],
+            ),
+            (
+                "save",
+                self.clean_and_save_combined_features,
+                [],
+                [
+                    ETLPipeline.clean_and_save_combined_features,
+                    ETLPipeline._save_as_jsonb,
+                    ETLPipeline._serialize_jsonb_chunk,
+                    ETLPipeline._save_as_columns,
+                    ETLPipeline._row_hashes,
+                    ETLPipeline._postgres_column_types,
+                    ETLPipeline._widened_type,
+                    ETLPipeline._sync_features_table_schema,
+                    ETLPipeline._serialize_csv_chunk,
+                    ParquetFeatureStore,
+                ],
+            ),
+        ]
+
+    def default_run_id(self):
+        todays_date = datetime.now(pytz.timezone("America/Denver")).date()
+        mode = "incremental" if self.incremental else "full"
+        if self.serving_features is not None:
+            mode += "_serving"
+        return f"{todays_date}_{mode}_{self.start_date}"
+
+    def run(
+        self,
+        run_id=None,
+        checkpoint_dir=CHECKPOINT_DIR,
+        resume=True,
+        profile_path=None,
+        cprofile_dir=None,
+        keep_checkpoints=False,
+    ):
+        """
+        Runs the ETL stages in order: load, prepare, pre_merge, merge,
+        post_merge and save. With a checkpoint_dir, each stage output is stored
+        under run_id together with a key made of the stage's input fingerprint
+        and the fingerprint of its code and the config. With resume, stages
+        whose stored key still matches are skipped and the run continues from
+        the output of the last valid stage. The first stage's input includes
+        the row count and latest date of every source feature table, so new or
+        removed snapshots invalidate the load. Checkpoints of a run are deleted
+        once it completes, unless keep_checkpoints, and runs left behind are
+        deleted after CHECKPOINT_RETENTION_DAYS.
+
+        With profile_path, time, memory and shapes of every stage and feature
+        creation method are written there as JSON. With cprofile_dir, each
+        stage is also run under cProfile and its stats dumped to that folder.
+        """
+        if run_id is None:
+            run_id = self.default_run_id()
+        if profile_path is not None or cprofile_dir is not None:
+            self.profiler = StageProfiler(cprofile_dir=cprofile_dir)
+        try:
+            self._run_stages(run_id, checkpoint_dir, resume, keep_checkpoints)
+        finally:
+            # Also written for failed runs, the last record is the failing stage
+            if profile_path is not None:
+                self.profiler.save(profile_path, run_id=run_id)
+
+    def run_streaming(
+        self,
+        run_id=None,
+        checkpoint_dir=CHECKPOINT_DIR,
+        resume=True,
+        profile_path=None,
+        cprofile_dir=None,
+        keep_checkpoints=False,
+    ):
+        """
+        Full rebuild that runs every stage one season at a time, so peak memory
+        is bounded by the largest season instead of the whole history. Each
+        season only loads its own games and the feature snapshots its games
+        are matched to, and is checkpointed as its own run (run_id_season).
+        Season checkpoints are kept until every season is done, so a failed
+        rebuild resumes from the season it stopped at.
+
+        No state has to be carried between seasons: z-scores, percentiles and
+        the merge only use snapshots of the same date, and the post-merge team
+        history features reset at the start of every season.
+        """
+        if self.incremental:
+            raise ValueError("Streaming runs are full rebuilds, not incremental")
+        if run_id is None:
+            run_id = self.default_run_id()
+
+        all_game_data = self.game_data
+        start_date = self.start_date
+        # Raises for games outside of a season, like the post-merge stage would
+        seasons = SEASON_CALENDAR.lookup(all_game_data["game_datetime"])["season"]
+        try:
+            for season in pd.unique(seasons):
+                dates = self.config.NBA_IMPORTANT_DATES[season]
+                # A game uses the snapshot through the day before it
+                season_start = pd.Timestamp(
+                    dates["reg_season_start_date"]
+                ) - pd.Timedelta(days=1)
+                self.start_date = max(pd.Timestamp(start_date), season_start).strftime(
+                    "%Y-%m-%d"
+                )
+                self.end_date = (
+                    pd.Timestamp(dates["postseason_end_date"]) + pd.Timedelta(days=1)
+                ).strftime("%Y-%m-%d")
+                self.game_data = all_game_data.loc[
+                    (seasons == season).to_numpy()
+                ].reset_index(drop=True)
+                self.features_data = {}
+                self.combined_features = None
+
+                print(f"\n+++ Streaming Season {season}")
+                print("Games:", len(self.game_data))
+                self.run(
+                    run_id=f"{run_id}_{season}",
+                    checkpoint_dir=checkpoint_dir,
+                    resume=resume,
+                    keep_checkpoints=True,
+                    profile_path=(
+                        None
+                        if profile_path is None
+                        else f"{os.path.splitext(profile_path)[0]}_{season}.json"
+                    ),
+                    cprofile_dir=(
+                        None
+                        if cprofile_dir is None
+                        else os.path.join(cprofile_dir, season)
+                    ),
+                )
+
+                # Release the season before loading the next one
+                self.features_data = {}
+                self.combined_features = None
+                gc.collect()
+
+            if checkpoint_dir is not None and not keep_checkpoints:
+                for season in pd.unique(seasons):
+                    StageCheckpointer(checkpoint_dir, f"{run_id}_{season}").delete()
+                print(f"\n+++ Checkpoints Removed for Run {run_id}")
+        finally:
+            self.game_data = all_game_data
+            self.start_date = start_date
+            self.end_date = None
+
+    def _run_stage(self, stage):
+        name, function, outputs, _ = stage
+        with self.profiler.stage(name, self._stage_inputs(name)) as record:
+            function()
+            if outputs:
+                record["outputs"] = {
+                    attribute: getattr(self, attribute) for attribute in outputs
+                }
+
+    def _stage_inputs(self, name):
+        if name == "load":
+            return {"game_data": self.game_data}
+        if name in ["prepare", "pre_merge"]:
+            return self.features_data
+        if name == "merge":
+            return {"game_data": self.game_data, "features_data": self.features_data}
+        return self.combined_features
+
+    def _run_stages(self, run_id, checkpoint_dir, resume, keep_checkpoints=False):
+        stages = self._stages()
+        if checkpoint_dir is None:
+            for stage in stages:
+                self._run_stage(stage)
+            return
+
+        expired_runs = StageCheckpointer.remove_expired(checkpoint_dir)
+        if expired_runs:
+            print("\n+++ Expired Checkpoints Removed:", expired_runs)
+        checkpoints = StageCheckpointer(checkpoint_dir, run_id)
+
+        # The loaded games and the run parameters are the input of the first stage
+        input_fingerprint = data_fingerprint(
+            {
+                "game_data": data_fingerprint(self.game_data),
+                "start_date": self.start_date,
+                "game_start_date": self.game_start_date,
+                "end_date": self.end_date,
+                "merge_mode": self.merge_mode,
+                "max_staleness_days": self.max_staleness_days,
+                "team_encoding": self.team_encoding,
+                "feature_tables": self.feature_tables,
+                "feature_sources": self._source_fingerprints(),
+                "serving_features": self.serving_features,
+                "games_to_update": sorted(self.games_to_update or []),
+            }
+        )
+        config_fingerprint = data_fingerprint(
+            {
+                "FEATURE_TABLE_INFO": self.config.FEATURE_TABLE_INFO,
+                "TEAM_MAP": self.config.TEAM_MAP,
+                "NBA_IMPORTANT_DATES": self.config.NBA_IMPORTANT_DATES,
+            }
+        )
+
+        def stage_key(stage, input_fingerprint):
+            return checkpoints.stage_key(
+                input_fingerprint, code_fingerprint(*stage[3]) + config_fingerprint
+            )
+
+        first_stage_to_run = 0
+        if resume:
+            for stage in stages:
+                if not checkpoints.is_valid(
+                    stage[0], stage_key(stage, input_fingerprint)
+                ):
+                    break
+                input_fingerprint = checkpoints.output_fingerprint(stage[0])
+                first_stage_to_run += 1
+
+        if first_stage_to_run == len(stages):
+            print(f"\n---All Stages Up to Date for Run {run_id}")
+            if not keep_checkpoints:
+                checkpoints.delete()
+            return
+        if first_stage_to_run > 0:
+            last_valid_stage = stages[first_stage_to_run - 1][0]
+            for attribute, value in checkpoints.load(last_valid_stage).items():
+                setattr(self, attribute, value)
+            print(f"\n+++ Resumed Run {run_id} After Stage: {last_valid_stage}")
+        checkpoints.invalidate([stage[0] for stage in stages[first_stage_to_run:]])
+
+        for stage in stages[first_stage_to_run:]:
+            name, _, outputs, _ = stage
+            key = stage_key(stage, input_fingerprint)
+            self._run_stage(stage)
+            input_fingerprint = checkpoints.save(
+                name,
+                key,
+                {attribute: getattr(self, attribute) for attribute in outputs},
+            )
+            print(f"\n+++ Stage Checkpointed: {name}")
+
+        if not keep_checkpoints:
+            checkpoints.delete()
+            print(f"\n+++ Checkpoints Removed for Run {run_id}")
+
+    # INCREMENTAL UPDATES
+
+    def load_watermarks(self):
+        query = text("SELECT table_name, watermark FROM etl_watermarks;")
+        with self.database_engine.connect() as connection:
+            rows = connection.execute(query).fetchall()
+        return {table_name: watermark for table_name, watermark in rows}
+
+    def save_watermarks(self):
+        query = text(
+            """
+            INSERT INTO etl_watermarks (table_name, watermark, last_update)
+            VALUES (:table_name, :watermark, :last_update)
+            ON CONFLICT (table_name)
+            DO UPDATE
+            SET watermark = excluded.watermark, last_update = excluded.last_update
+            """
+        )
+        last_update = datetime.now(pytz.timezone("America/Denver")).replace(
+            tzinfo=None, microsecond=0
+        )
+        with self.database_engine.begin() as connection:
+            for table_name, watermark in self.new_watermarks.items():
+                if watermark is None:
+                    continue
+                connection.execute(
+                    query,
+                    {
+                        "table_name": table_name,
+                        "watermark": watermark,
+                        "last_update": last_update,
+                    },
+                )
+        self.watermarks.update(
+            {k: v for k, v in self.new_watermarks.items() if v is not None}
+        )
+        print("\n+++ Watermarks Updated")
+        for k, v in self.new_watermarks.items():
+            print(k, v)
+
+    def _set_incremental_window(self):
+        """
+        Uses the stored watermarks to find the earliest date whose features are
+        affected by new source data. Feature tables are loaded from that date and
+        game data from the start of its season, since streaks, last 5 results and
+        win percentages are built from every prior game in the season. Feature
+        tables are checked from watermark_lookback_days before their watermark
+        to pick up re-scraped snapshots, so those days are always rebuilt.
+        """
+        try:
+            self.watermarks = self.load_watermarks()
+            tracked_tables = ["games"] + list(self.feature_tables)
+            if any(table not in self.watermarks for table in tracked_tables):
+                print(
+                    "\n---Missing Watermarks, Running Full Update from", self.start_date
+                )
+                self.new_watermarks = self._current_max_watermarks()
+                return
+
+            # Games with new scores or odds since the last run
+            query = text(
+                """
+                SELECT game_id, game_datetime,
+                    GREATEST(scores_last_update, odds_last_update) AS last_update
+                FROM games
+                WHERE GREATEST(scores_last_update, odds_last_update) > :watermark;
+                """
+            )
+            with self.database_engine.connect() as connection:
+                changed_games = pd.read_sql_query(
+                    query,
+                    connection,
+                    params={"watermark": self.watermarks["games"]},
+                    parse_dates=["game_datetime", "last_update"],
+                )
+            self.changed_game_ids = set(changed_games["game_id"])
+            self.new_watermarks["games"] = (
+                changed_games["last_update"].max() if len(changed_games) else None
+            )
+
+            # New daily snapshots in the feature tables
+            change_dates = list(changed_games["game_datetime"].dt.normalize())
+            for table_name in self.feature_tables:
+                date_column = self.config.FEATURE_TABLE_INFO[table_name]["date_column"]
+                query = text(
+                    f"SELECT MIN({date_column}), MAX({date_column}) FROM {table_name} "
+                    f"WHERE {date_column} > :watermark;"
+                )
+                watermark = pd.Timestamp(self.watermarks[table_name]) - pd.Timedelta(
+                    days=self.watermark_lookback_days
+                )
+                with self.database_engine.connect() as connection:
+                    min_date, max_date = connection.execute(
+                        query, {"watermark": watermark.to_pydatetime()}
+                    ).fetchone()
+                self.new_watermarks[table_name] = max_date
+                if min_date is not None:
+                    # Snapshot through to_date is used by games on the next day
+                    snapshot_game_date = pd.Timestamp(min_date) + pd.Timedelta(days=1)
+                    change_dates.append(snapshot_game_date)
+                    if (
+                        self.affected_from_date is None
+                        or snapshot_game_date < self.affected_from_date
+                    ):
+                        self.affected_from_date = snapshot_game_date
+
+            if len(change_dates) == 0:
+                # Nothing to rebuild, keep the loaded window as small as possible
+                earliest_change = pd.Timestamp(
+                    datetime.now(pytz.timezone("America/Denver")).date()
+                )
+                game_start_date = earliest_change.strftime("%Y-%m-%d")
+                print("\n---No Changes Found Since Last Run")
+            else:
+                earliest_change = min(change_dates)
+                try:
+                    season_info = find_season_information(
+                        earliest_change.strftime("%Y-%m-%d")
+                    )
+                    game_start_date = season_info["reg_season_start_date"]
+                except ValueError:
+                    # Offseason change, no prior games in the season to carry over
+                    game_start_date = earliest_change.strftime("%Y-%m-%d")
+
+            self.start_date = (earliest_change - pd.Timedelta(days=1)).strftime(
+                "%Y-%m-%d"
+            )
+            self.game_start_date = game_start_date
+            print("\n+++ Incremental Window Set")
+            print("Earliest Change:", earliest_change.strftime("%Y-%m-%d"))
+            print("Feature Start Date:", self.start_date)
+            print("Game Start Date:", self.game_start_date)
+        except Exception as e:
+            print("\n*** Error Setting Incremental Window")
+            raise e
+
+    def _current_max_watermarks(self):
+        watermarks = {}
+        with self.database_engine.connect() as connection:
+            watermarks["games"] = connection.execute(
+                text(
+                    "SELECT MAX(GREATEST(scores_last_update, odds_last_update)) FROM games;"
+                )
+            ).scalar()
+            for table_name in self.feature_tables:
+                date_column = self.config.FEATURE_TABLE_INFO[table_name]["date_column"]
+                watermarks[table_name] = connection.execute(
+                    text(f"SELECT MAX({date_column}) FROM {table_name};")
+                ).scalar()
+        return watermarks
+
+    def _find_games_to_update(self):
+        """
+        Marks the games whose features need to be recomputed: games with new
+        scores or odds, games played on or after a new feature snapshot, and
+        every later game in the season for the teams involved in a changed game.
+        """
+        if self.changed_game_ids is None:
+            # Full update, every loaded game is rebuilt
+            return
+
+        games = self.game_data
+        game_dates = games["game_datetime"].dt.normalize()
+        to_update = games["game_id"].isin(self.changed_game_ids)
+
+        if self.affected_from_date is not None:
+            to_update |= game_dates >= self.affected_from_date
+
+        # Propagate changed results forward to later games of the same teams
+        changed = games.loc[games["game_id"].isin(self.changed_game_ids)]
+        if len(changed) > 0:
+            positions = SEASON_CALENDAR.season_positions(games["game_datetime"])
+            seasons = pd.Series(
+                np.where(positions >= 0, SEASON_CALENDAR.seasons[positions], None),
+                index=games.index,
+            )
+            team_changes = pd.concat(
+                [
+                    pd.DataFrame(
+                        {
+                            "team": changed[team_column],
+                            "season": seasons.loc[changed.index],
+                            "first_change": changed["game_datetime"],
+                        }
+                    )
+                    for team_column in ["home_team", "away_team"]
+                ]
+            )
+            first_change = team_changes.groupby(["team", "season"], observed=True)[
+                "first_change"
+            ].min()
+            for team_column in ["home_team", "away_team"]:
+                keys = pd.MultiIndex.from_arrays([games[team_column], seasons])
+                team_first_change = first_change.reindex(keys).to_numpy()
+                to_update |= pd.Series(
+                    games["game_datetime"].to_numpy() >= team_first_change,
+                    index=games.index,
+                )
+
+        self.games_to_update = set(games.loc[to_update, "game_id"])
+        print("\n+++ Games to Update Found")
+        print("Games to Update:", len(self.games_to_update))
+
     # DATA LOADING
 
     def load_table(
-        self, table_name, date_column, columns_to_load=None, start_date=None
+        self,
+        table_name,
+        date_column,
+        columns_to_load=None,
+        start_date=None,
+        end_date=None,
+        chunk_size=LOAD_CHUNK_SIZE,
+        output="pandas",
     ):
-        if columns_to_load is None:
-            columns = "*"
-        else:
-            columns = ", ".join(columns_to_load)
+        """
+        Reads the rows of iter_table_chunks into one DataFrame or Arrow table.
+        Chunks are split into their columns as they arrive and every column is
+        concatenated and released on its own, so besides the table only one
+        column is held twice, instead of all the chunks plus their
+        concatenation. The whole table still has to fit in memory, iterate
+        the chunks otherwise. Integer and Boolean columns follow pd.read_sql
+        over the whole table: int64 and bool, or float64 and object when any
+        row is missing a value.
+        """
+        chunks = self.iter_table_chunks(
+            table_name,
+            date_column,
+            columns_to_load,
+            start_date=start_date,
+            end_date=end_date,
+            chunk_size=chunk_size,
+            output=output,
+        )
+        schema = self._table_schema(table_name, date_column, columns_to_load)
+        if output == "arrow":
+            return pa.Table.from_batches(
+                list(chunks), schema=self._arrow_schema(schema)
+            )
+
+        column_chunks = {col: [] for col, _ in schema}
+        for chunk in chunks:
+            for col in column_chunks:
+                column_chunks[col].append(chunk[col])
+            del chunk
+        columns = {}
+        for col, column_type in schema:
+            values = column_chunks.pop(col)
+            if not values:
+                values = self._rows_to_frame([], schema)[col]
+            elif len(values) == 1:
+                values = values[0]
+            else:
+                values = pd.concat(values, ignore_index=True)
+            columns[col] = self._read_sql_values(values, column_type)
+        # copy=False keeps every column in its own block instead of copying
+        # same-typed columns into one
+        return pd.DataFrame(columns, copy=False)
+
+    @staticmethod
+    def _read_sql_values(values, column_type):
+        # Integer and Boolean columns as pd.read_sql types them
+        if column_type is Integer:
+            dtype = "float64" if values.hasnans else "int64"
+            return values.to_numpy(dtype=dtype, na_value=np.nan)
+        if column_type is Boolean:
+            dtype = object if values.hasnans else bool
+            return values.to_numpy(dtype=dtype, na_value=None)
+        return values.to_numpy()
+
+    def iter_table_chunks(
+        self,
+        table_name,
+        date_column,
+        columns_to_load=None,
+        start_date=None,
+        end_date=None,
+        chunk_size=LOAD_CHUNK_SIZE,
+        output="pandas",
+    ):
+        """
+        Yields the rows of table_name with start_date <= date_column < end_date
+        (default tomorrow) in chunks of chunk_size rows, read through a
+        server-side cursor. Chunks are pandas DataFrames or Arrow record
+        batches (output="arrow") typed from the ORM model of the table, with
+        the same dtypes in every chunk (Int64 and boolean for Integer and
+        Boolean columns, which can hold missing values).
+        """
+        if output not in ["pandas", "arrow"]:
+            raise ValueError(f"Unknown output format: {output}")
+        schema = self._table_schema(table_name, date_column, columns_to_load)
         if start_date is None:
             start_date = self.start_date
+        if end_date is None:
+            end_date = self.end_date
+        if end_date is None:
+            todays_date = datetime.now(pytz.timezone("America/Denver")).date()
+            end_date = todays_date + timedelta(days=1)
+
+        columns = ", ".join(col for col, _ in schema)
+        query = text(
+            f"SELECT {columns} FROM {table_name} "
+            f"WHERE {date_column} >= :start_date AND {date_column} < :end_date;"
+        )
+        with self.database_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                query, {"start_date": start_date, "end_date": end_date}
+            )
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if output == "arrow":
+                    yield self._rows_to_record_batch(rows, schema)
+                else:
+                    yield self._rows_to_frame(rows, schema)
 
-        todays_date = datetime.now(pytz.timezone("America/Denver")).date()
-        tomorrows_date = todays_date + timedelta(days=1)
+    @staticmethod
+    def _table_schema(table_name, date_column, columns_to_load=None):
+        # Column names can't be bound parameters, only ORM declared ones are allowed
+        if table_name not in Base.metadata.tables:
+            raise ValueError(f"Table not declared in database_orm: {table_name}")
+        table_columns = Base.metadata.tables[table_name].columns
+        if columns_to_load is None:
+            columns_to_load = [col.name for col in table_columns]
+        unknown_columns = [
+            col
+            for col in list(columns_to_load) + [date_column]
+            if col not in table_columns
+        ]
+        if unknown_columns:
+            raise ValueError(f"Columns not in {table_name}: {unknown_columns}")
+        return [(col, type(table_columns[col].type)) for col in columns_to_load]
 
-        query = f"SELECT {columns} FROM {table_name} WHERE {date_column} >= '{start_date}' AND {date_column} < '{tomorrows_date}';"
-        with self.database_engine.connect() as connection:
-            return pd.read_sql_query(query, connection, parse_dates=[date_column])
+    @staticmethod
+    def _rows_to_frame(rows, schema):
+        # Dtypes are declared by the ORM types, not inferred from the chunk
+        data = {}
+        columns = list(zip(*rows)) if rows else [()] * len(schema)
+        for (col, column_type), values in zip(schema, columns):
+            dtype = ORM_PANDAS_DTYPES.get(column_type, "object")
+            if dtype in ["Int64", "boolean"]:
+                data[col] = pd.array(values, dtype=dtype)
+            else:
+                data[col] = np.array(values, dtype=dtype)
+        return pd.DataFrame(data, columns=[col for col, _ in schema])
+
+    @staticmethod
+    def _arrow_schema(schema):
+        return pa.schema(
+            [
+                (col, ORM_ARROW_TYPES.get(column_type, pa.string()))
+                for col, column_type in schema
+            ]
+        )
+
+    @staticmethod
+    def _rows_to_record_batch(rows, schema):
+        arrow_schema = ETLPipeline._arrow_schema(schema)
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), arrow_schema)
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
 
     def load_game_data(self):
         features = [
@@ -73,57 +884,199 @@ class ETLPipeline:
             "game_completed",
         ]
         try:
-            game_data = self.load_table("games", "game_datetime", features)
+            game_data = self.load_table(
+                "games", "game_datetime", features, start_date=self.game_start_date
+            )
+            game_data = self._drop_unknown_teams(game_data)
+            game_data = apply_categorical_vocabulary(game_data)
             print("\n+++ Game Data Loaded", game_data.shape)
             return game_data
         except Exception as e:
             print("\n*** Error Loading Game Data")
             raise e
 
+    @staticmethod
+    def _drop_unknown_teams(game_data):
+        # Games of teams outside the team vocabulary (All-Star or exhibition
+        # teams) have no features to match, they are dropped like the rows of
+        # unknown teams in the feature tables instead of failing the load
+        known = np.ones(len(game_data), dtype=bool)
+        unknown_teams = set()
+        for column in ["home_team", "away_team"]:
+            column_known = (
+                game_data[column].isin(TEAM_DTYPE.categories) | game_data[column].isna()
+            ).to_numpy()
+            unknown_teams.update(game_data.loc[~column_known, column].unique())
+            known &= column_known
+        if not known.all():
+            print(
+                f"***{(~known).sum()} Rows Removed from games due to Unknown Team Names: {sorted(unknown_teams)}"
+            )
+            game_data = game_data[known].reset_index(drop=True)
+        return game_data
+
     def load_features_data(self, table_names):
-        features_data = {}
-        for table_name in table_names:
-            try:
-                date_column = self.config.FEATURE_TABLE_INFO[table_name]["date_column"]
-                columns = (
-                    self.config.FEATURE_TABLE_INFO[table_name]["info_columns"]
-                    + self.config.FEATURE_TABLE_INFO[table_name]["feature_columns"]
-                )
-                features_data[table_name] = self.load_table(
-                    table_name, date_column, columns
-                )
-            except Exception as e:
-                print(f"\n*** Error Loading Feature Table: {table_name}")
-                raise e
+        # Tables are independent, with max_workers > 1 they are queried concurrently
+        # over separate pooled connections
+        if self.max_workers > 1 and len(table_names) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    table_name: executor.submit(self._load_feature_table, table_name)
+                    for table_name in table_names
+                }
+                features_data = {
+                    table_name: future.result()
+                    for table_name, future in futures.items()
+                }
+        else:
+            features_data = {
+                table_name: self._load_feature_table(table_name)
+                for table_name in table_names
+            }
         self.features_data = features_data
         print("\n+++ Features Data Loaded")
         print("Tables Loaded: ")
         for k, v in features_data.items():
             print(k, v.shape)
 
+    def _load_feature_table(self, table_name):
+        try:
+            date_column = self.config.FEATURE_TABLE_INFO[table_name]["date_column"]
+            feature_columns = self.config.FEATURE_TABLE_INFO[table_name][
+                "feature_columns"
+            ]
+            if self.feature_plan is not None:
+                feature_columns = self.feature_plan["tables"][table_name]["columns"]
+            columns = (
+                self.config.FEATURE_TABLE_INFO[table_name]["info_columns"]
+                + feature_columns
+            )
+            return self.load_table(
+                table_name,
+                date_column,
+                columns,
+                start_date=self._feature_start_date(),
+            )
+        except Exception as e:
+            print(f"\n*** Error Loading Feature Table: {table_name}")
+            raise e
+
+    def _feature_start_date(self):
+        start_date = self.start_date
+        if self.merge_mode == "asof":
+            # Games at the start of the window can use older snapshots
+            start_date = (
+                pd.Timestamp(start_date) - pd.Timedelta(days=self.max_staleness_days)
+            ).strftime("%Y-%m-%d")
+        return start_date
+
+    def _source_fingerprints(self):
+        """
+        Row count and latest date of every feature table over the window the
+        load stage reads, a cheap check that its snapshots haven't changed.
+        """
+        end_date = self.end_date
+        if end_date is None:
+            todays_date = datetime.now(pytz.timezone("America/Denver")).date()
+            end_date = todays_date + timedelta(days=1)
+        fingerprints = {}
+        try:
+            with self.database_engine.connect() as connection:
+                for table_name in self.feature_tables:
+                    date_column = self.config.FEATURE_TABLE_INFO[table_name][
+                        "date_column"
+                    ]
+                    query = text(
+                        f"SELECT COUNT(*), MAX({date_column}) FROM {table_name} "
+                        f"WHERE {date_column} >= :start_date AND {date_column} < :end_date;"
+                    )
+                    num_rows, max_date = connection.execute(
+                        query,
+                        {
+                            "start_date": self._feature_start_date(),
+                            "end_date": end_date,
+                        },
+                    ).fetchone()
+                    fingerprints[table_name] = [num_rows, str(max_date)]
+        except Exception as e:
+            print("\n*** Error Fingerprinting Feature Tables")
+            raise e
+        return fingerprints
+
     # DATA CLEANING and PREPARATION
     def prepare_table(self, table, table_name):
-        working_table = table.copy()
+        self.features_data[table_name] = self._prepare_table(
+            table,
+            table_name,
+            self.config.TEAM_MAP,
+            self.config.FEATURE_TABLE_INFO[table_name]["primary_key"],
+        )
+
+    @staticmethod
+    def _prepare_table(table, table_name, team_map, primary_key):
+        # Static so it can be sent to a process pool. Every step replaces
+        # whole columns instead of writing into them, so a shallow copy keeps
+        # the loaded table as it is without copying its data
+        working_table = table.copy(deep=False)
 
         # Standardize Team Names
-        working_table = self._standardize_teams_in_dataframe(working_table, table_name)
+        working_table = ETLPipeline._standardize_teams_in_dataframe(
+            working_table, table_name, team_map
+        )
 
         # Manage Duplicate Rows
-        working_table = self._check_duplicates(working_table, table_name)
+        working_table = ETLPipeline._check_duplicates(
+            working_table, table_name, primary_key
+        )
 
-        # Downcast Data Types
-        working_table, _ = self.downcast_data_types(working_table, downcast_floats=True)
+        # Team names and game sets as shared categoricals
+        working_table = apply_categorical_vocabulary(working_table)
 
-        self.features_data[table_name] = working_table
+        # Downcast Data Types
+        working_table, _ = ETLPipeline.downcast_data_types(
+            working_table, downcast_floats=True, report_memory=False
+        )
 
-    def prepare_all_tables(self):
-        for table_name, table in self.features_data.items():
-            self.prepare_table(table, table_name)
+        return working_table
+
+    def prepare_all_tables(self, executor="thread"):
+        """
+        Prepares every feature table. With max_workers > 1 the tables are
+        prepared concurrently in a thread pool, or in a process pool with
+        executor="process" (tables are pickled to and from the workers).
+        """
+        if self.max_workers > 1 and len(self.features_data) > 1:
+            if executor == "process":
+                pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            elif executor == "thread":
+                pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                raise ValueError(f"Unknown executor: {executor}")
+            with pool:
+                futures = {
+                    table_name: pool.submit(
+                        self._prepare_table,
+                        table,
+                        table_name,
+                        self.config.TEAM_MAP,
+                        self.config.FEATURE_TABLE_INFO[table_name]["primary_key"],
+                    )
+                    for table_name, table in self.features_data.items()
+                }
+                for table_name, future in futures.items():
+                    self.features_data[table_name] = future.result()
+        else:
+            for table_name, table in self.features_data.items():
+                self.prepare_table(table, table_name)
         print("\n+++ All Tables Prepared")
 
     def feature_creation_pre_merge(self):
         self.features_data = FeatureCreationPreMerge(
-            self.features_data
+            self.features_data,
+            profiler=self.profiler,
+            transform_columns=(
+                None if self.feature_plan is None else self.feature_plan["tables"]
+            ),
         ).full_feature_creation()
         print("\n+++ Feature Creation Pre-Merge Complete")
         print("Updated Tables:")
@@ -131,38 +1084,57 @@ class ETLPipeline:
             print(k, v.shape)
 
     def merge_features_data(self):
+        # Nothing after the merge reads the tables, they are handed over and
+        # released one at a time instead of being held through post-merge and save
+        nbastats_team_dfs = {
+            table_name: self.features_data[table_name]
+            for table_name in self.feature_tables
+        }
+        self.features_data = {}
         self.combined_features = self._merge_game_to_nbastats_team(
             self.game_data,
-            {
-                "team_nbastats_general_traditional": self.features_data[
-                    "team_nbastats_general_traditional"
-                ],
-                "team_nbastats_general_advanced": self.features_data[
-                    "team_nbastats_general_advanced"
-                ],
-                "team_nbastats_general_fourfactors": self.features_data[
-                    "team_nbastats_general_fourfactors"
-                ],
-                "team_nbastats_general_opponent": self.features_data[
-                    "team_nbastats_general_opponent"
-                ],
-            },
+            nbastats_team_dfs,
+            merge_mode=self.merge_mode,
+            max_staleness_days=self.max_staleness_days,
+            output_columns=(
+                None if self.feature_plan is None else set(self.feature_plan["columns"])
+            ),
+            consume_tables=True,
         )
         print("\n+++ Features Data Merged with Game Data")
         print("Combined Data Shape:", self.combined_features.shape)
 
     def feature_creation_post_merge(self):
         self.combined_features = FeatureCreationPostMerge(
-            self.combined_features
+            self.combined_features,
+            profiler=self.profiler,
+            max_workers=self.post_merge_workers,
+            team_encoding=self.team_encoding,
         ).full_feature_creation()
+        if self.feature_plan is not None:
+            self.combined_features = self.combined_features[
+                self.feature_plan["columns"]
+            ]
         print("\n+++ Feature Creation Post-Merge Complete")
         print("Updated Combined Features Shape:", self.combined_features.shape)
 
     def clean_and_save_combined_features(self):
+        if self.games_to_update is not None:
+            self.combined_features = self.combined_features[
+                self.combined_features["game_id"].isin(self.games_to_update)
+            ]
+            print("\n+++ Combined Features Filtered to Games to Update")
+            print("Filtered Combined Features Shape:", self.combined_features.shape)
+            if len(self.combined_features) == 0:
+                print("\n---No Games to Update")
+                self.save_watermarks()
+                return
+
         self.combined_features, info = self.check_duplicates(
             self.combined_features, "game_id", filter=False
         )
         if info["num_duplicate_keys"] > 0:
+            print("Game IDs with Different Rows:", info["non_perfect_duplicate_keys"])
             raise Exception("\n*** Duplicate Game IDs Found Before Saving")
 
         self.combined_features, info = self.downcast_data_types(
@@ -173,116 +1145,593 @@ class ETLPipeline:
 
         # print(self.combined_features.info(verbose=True, null_counts=True, max_cols=1000))
 
-        self._save_as_jsonb(self.combined_features)
+        # Serving runs only hold some features, they are merged into the stored
+        # rows, and leave the feature store and the watermarks to full runs
+        serving = self.serving_features is not None
+        row_counts = self._save_as_jsonb(self.combined_features, merge_existing=serving)
         print("\n+++ Combined Features Saved to JSONB Table")
-
-    def _save_as_jsonb(self, df):
-        try:
-            # Convert datetime to string format
-            df["game_datetime"] = df["game_datetime"].dt.strftime("%Y-%m-%d %H:%M:%S")
-
-            # Constructing the data column
-            df["data"] = df.apply(
-                lambda row: {
-                    key: (value if pd.notna(value) else None)
-                    for key, value in row.items()
-                    if key != "game_id"
-                },
-                axis=1,
+        print(
+            "Rows Inserted: {inserted}, Updated: {updated}, Unchanged: {skipped}".format(
+                **row_counts
             )
+        )
 
-            # Convert the 'data' column directly to JSON string
-            df["data"] = df["data"].apply(json.dumps)
-
-            # Filter to keep only 'game_id' and 'data' columns
-            df = df[["game_id", "data"]]
-
-            # Save to temporary table
-            df.to_sql(
-                "temp_table", self.database_engine, if_exists="replace", index=False
+        row_counts = self._save_as_columns(self.combined_features)
+        print(f"\n+++ Combined Features Saved to Typed Table {FEATURES_TABLE}")
+        print(
+            "Rows Inserted: {inserted}, Updated: {updated}, Unchanged: {skipped}".format(
+                **row_counts
             )
+        )
 
-            with self.database_engine.begin() as connection:
-                query = """
-                    INSERT INTO all_features_json (game_id, data)
-                    SELECT game_id, data::jsonb FROM temp_table
-                    ON CONFLICT (game_id) 
-                    DO UPDATE
-                    SET data = excluded.data
-                """
+        if serving:
+            print("\n---Feature Store and Watermarks Not Updated by Serving Runs")
+            return
 
-                result = connection.execute(query)
+        if self.feature_store is not None:
+            rows_written = self.feature_store.write(self.combined_features)
+            print("\n+++ Combined Features Saved to Parquet Feature Store")
+            print("Seasons Written:", rows_written)
 
-                # Optional: Check the number of rows affected
-                # print(f"{result.rowcount} rows affected.")
+        if self.incremental:
+            self.save_watermarks()
 
-                drop_query = "DROP TABLE temp_table;"
-                connection.execute(drop_query)
+    def _save_as_jsonb(
+        self, df, chunk_size=JSONB_COPY_CHUNK_SIZE, merge_existing=False
+    ):
+        """
+        Upserts the combined features into all_features_json. Rows are
+        serialized straight from the column arrays and streamed with COPY into
+        an unlogged staging table, chunk_size rows at a time, and each chunk is
+        upserted from there. All chunks are committed as one transaction.
+        Every row is stored with a hash of its features, and existing rows are
+        only rewritten when the hash changed. With merge_existing, the features
+        of existing rows are updated and the ones not in df are kept, instead
+        of the whole row being replaced, unless they already hold those values.
+        Returns the number of rows inserted, updated and skipped as unchanged.
+        """
+        if merge_existing:
+            # The hash of the merged features isn't known here, it is cleared
+            # so the next full run rewrites the row and stores it
+            update = "data = all_features_json.data || excluded.data, data_hash = NULL"
+            changed = "NOT all_features_json.data @> excluded.data"
+        else:
+            update = "data = excluded.data, data_hash = excluded.data_hash"
+            changed = "all_features_json.data_hash IS DISTINCT FROM excluded.data_hash"
+        row_counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        try:
+            connection = self.database_engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                # The column is added by the migrations of database_orm.py, DDL
+                # here would lock the table for readers until the commit
+                cursor.execute(
+                    """
+                    SELECT 1
+                    FROM information_schema.columns
+                    WHERE table_schema = current_schema()
+                        AND table_name = 'all_features_json'
+                        AND column_name = 'data_hash'
+                    """
+                )
+                if cursor.fetchone() is None:
+                    raise Exception(
+                        "all_features_json has no data_hash column, run the migrations with python src/database_orm.py"
+                    )
+                cursor.execute(f"DROP TABLE IF EXISTS {JSONB_STAGING_TABLE}")
+                cursor.execute(
+                    f"""
+                    CREATE UNLOGGED TABLE {JSONB_STAGING_TABLE} (
+                        game_id VARCHAR,
+                        data JSONB,
+                        data_hash VARCHAR
+                    )
+                    """
+                )
+
+                for start in range(0, len(df), chunk_size):
+                    chunk_df = df.iloc[start : start + chunk_size]
+                    chunk = self._serialize_jsonb_chunk(chunk_df)
+                    cursor.copy_expert(
+                        f"COPY {JSONB_STAGING_TABLE} (game_id, data, data_hash) FROM STDIN",
+                        io.BytesIO(chunk),
+                    )
+                    # Rows skipped by the WHERE clause are not returned, xmax
+                    # is 0 for inserted rows
+                    cursor.execute(
+                        f"""
+                        INSERT INTO all_features_json (game_id, data, data_hash)
+                        SELECT game_id, data, data_hash FROM {JSONB_STAGING_TABLE}
+                        ON CONFLICT (game_id)
+                        DO UPDATE
+                        SET {update}
+                        WHERE {changed}
+                        RETURNING (xmax = 0)
+                        """
+                    )
+                    written = [inserted for (inserted,) in cursor.fetchall()]
+                    row_counts["inserted"] += sum(written)
+                    row_counts["updated"] += len(written) - sum(written)
+                    row_counts["skipped"] += len(chunk_df) - len(written)
+                    cursor.execute(f"TRUNCATE {JSONB_STAGING_TABLE}")
+
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.close()
         except Exception as e:
             print("\n*** Error Saving Combined Features as JSONB")
             raise e
 
-    def _merge_game_to_nbastats_team(self, game, nbastats_team_dfs):
-        # Create a copy of the game DataFrame to avoid modifying the original
-        features_df = game.copy()
-        # Create game_date string column for merging
-        features_df["game_date"] = features_df["game_datetime"].dt.date.astype("str")
-        # Creating a merge_date column within each nbastats_team_df
-        for table_name, table in nbastats_team_dfs.items():
-            table["merge_date"] = (
-                table["to_date"].dt.date + pd.DateOffset(days=1)
-            ).astype("str")
-
-        for table_name, table in nbastats_team_dfs.items():
-            for team in ["home", "away"]:
-                for game_set in ["all", "l2w"]:
-                    sub_df = table.loc[table.games == game_set].copy()
-
-                    # Rename columns to avoid duplicate column names
-                    table_suffix = table_name.split("_")[-1]
-                    columns_to_not_rename = [
-                        "team_name",
-                        "to_date",
-                        "merge_date",
-                        "games",
-                    ]
-                    sub_df.columns = [
-                        f"{col}_{team}_{game_set}_{table_suffix}"
-                        if col not in columns_to_not_rename
-                        else col
-                        for col in sub_df.columns
+        return row_counts
+
+    def _save_as_columns(self, df, chunk_size=JSONB_COPY_CHUNK_SIZE):
+        """
+        Upserts the combined features into the typed all_features table, one
+        column per feature, so readers can select only the columns they need.
+        The table is created from the columns of df and new or wider columns
+        are added or widened before the rows are copied through an unlogged
+        staging table, chunk_size rows at a time, in one transaction. Like
+        all_features_json, every row is stored with a hash of its features
+        (data_hash) and existing rows are only rewritten when it changed.
+        Returns the number of rows inserted, updated and skipped as unchanged.
+        """
+        row_counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        try:
+            connection = self.database_engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                column_types = self._sync_features_table_schema(
+                    cursor,
+                    {
+                        **self._postgres_column_types(df),
+                        "data_hash": "character varying",
+                    },
+                )
+                data_columns = [col for col in column_types if col != "data_hash"]
+                # The hash covers the column names and stored types, a new or
+                # retyped feature rewrites the rows
+                columns_digest = hashlib.blake2b(
+                    str({col: column_types[col] for col in data_columns}).encode(),
+                    digest_size=8,
+                ).hexdigest()
+                columns = ", ".join(f'"{col}"' for col in column_types)
+                updates = ", ".join(
+                    f'"{col}" = excluded."{col}"'
+                    for col in column_types
+                    if col != "game_id"
+                )
+
+                cursor.execute(f"DROP TABLE IF EXISTS {FEATURES_STAGING_TABLE}")
+                cursor.execute(
+                    f"CREATE UNLOGGED TABLE {FEATURES_STAGING_TABLE} (LIKE {FEATURES_TABLE})"
+                )
+
+                for start in range(0, len(df), chunk_size):
+                    # The column selection is a copy, data_hash is added to it
+                    chunk_df = df.iloc[start : start + chunk_size][data_columns].copy(
+                        deep=False
+                    )
+                    chunk_df["data_hash"] = [
+                        f"{columns_digest}{row_hash:016x}"
+                        for row_hash in self._row_hashes(chunk_df).tolist()
                     ]
+                    chunk = self._serialize_csv_chunk(chunk_df)
+                    cursor.copy_expert(
+                        f"COPY {FEATURES_STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)",
+                        io.BytesIO(chunk),
+                    )
+                    # Rows skipped by the WHERE clause are not returned, xmax
+                    # is 0 for inserted rows
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {FEATURES_TABLE} ({columns})
+                        SELECT {columns} FROM {FEATURES_STAGING_TABLE}
+                        ON CONFLICT (game_id)
+                        DO UPDATE
+                        SET {updates}
+                        WHERE {FEATURES_TABLE}.data_hash IS DISTINCT FROM excluded.data_hash
+                        RETURNING (xmax = 0)
+                        """
+                    )
+                    written = [inserted for (inserted,) in cursor.fetchall()]
+                    row_counts["inserted"] += sum(written)
+                    row_counts["updated"] += len(written) - sum(written)
+                    row_counts["skipped"] += len(chunk_df) - len(written)
+                    cursor.execute(f"TRUNCATE {FEATURES_STAGING_TABLE}")
+
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"\n*** Error Saving Combined Features to {FEATURES_TABLE}")
+            raise e
+
+        return row_counts
+
+    @staticmethod
+    def _postgres_column_types(df):
+        """
+        Postgres column type of each column of df. Object columns are typed by
+        their values, so nullable booleans are boolean, and all-null ones
+        are None, their type comes from the table (_sync_features_table_schema).
+        """
+        if len(df.columns) > POSTGRES_MAX_COLUMNS:
+            raise ValueError(
+                f"{len(df.columns)} columns, more than the {POSTGRES_MAX_COLUMNS} a Postgres table can hold"
+            )
+        long_names = [
+            col for col in df.columns if len(col) > POSTGRES_MAX_IDENTIFIER_LENGTH
+        ]
+        if long_names:
+            raise ValueError(f"Column names too long for Postgres: {long_names}")
+
+        column_types = {}
+        for col, dtype in df.dtypes.items():
+            # Sparse columns are written with their dense values
+            if isinstance(dtype, pd.SparseDtype):
+                dtype = dtype.subtype
+            if dtype.kind == "b":
+                column_types[col] = "boolean"
+            elif dtype.kind in "iu":
+                # Unsigned types need the next wider signed type
+                itemsize = dtype.itemsize * (2 if dtype.kind == "u" else 1)
+                column_types[col] = POSTGRES_INTEGER_TYPES.get(itemsize, "bigint")
+            elif dtype.kind == "f":
+                column_types[col] = (
+                    "real" if dtype.itemsize <= 4 else "double precision"
+                )
+            elif dtype.kind == "M":
+                column_types[col] = "timestamp without time zone"
+            elif dtype == object:
+                column_types[col] = POSTGRES_INFERRED_TYPES.get(
+                    pd.api.types.infer_dtype(df[col], skipna=True),
+                    "character varying",
+                )
+            else:
+                column_types[col] = "character varying"
+        return column_types
 
-                    # Merge the sub_df to the combo_df
-                    features_df = features_df.merge(
+    @staticmethod
+    def _widened_type(col, existing_type, column_type):
+        # Narrowest type holding the values of both, real only holds smallint
+        # values exactly so other integers and floats need double precision
+        if existing_type == column_type:
+            return existing_type
+        for order in [POSTGRES_INTEGER_ORDER, POSTGRES_FLOAT_ORDER]:
+            if existing_type in order and column_type in order:
+                return max(existing_type, column_type, key=order.index)
+        numeric_types = POSTGRES_INTEGER_ORDER + POSTGRES_FLOAT_ORDER
+        if existing_type in numeric_types and column_type in numeric_types:
+            if {existing_type, column_type} == {"smallint", "real"}:
+                return "real"
+            return "double precision"
+        raise ValueError(f"Type of {col} changed from {existing_type} to {column_type}")
+
+    @staticmethod
+    def _sync_features_table_schema(cursor, column_types):
+        """
+        Creates all_features or adds and widens its columns for column_types
+        and returns the types the columns are stored as. All-null columns
+        (None) take the type of the existing column and are left out when the
+        table doesn't have them yet.
+        """
+        cursor.execute(
+            """
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            """,
+            (FEATURES_TABLE,),
+        )
+        existing_types = dict(cursor.fetchall())
+
+        unknown_columns = [
+            col
+            for col, column_type in column_types.items()
+            if column_type is None and col not in existing_types
+        ]
+        if unknown_columns:
+            print(
+                f"\n---All-Null Columns Not Added to {FEATURES_TABLE}: {unknown_columns}"
+            )
+        column_types = {
+            col: existing_types.get(col) if column_type is None else column_type
+            for col, column_type in column_types.items()
+            if col not in unknown_columns
+        }
+
+        if not existing_types:
+            column_definitions = ", ".join(
+                f'"{col}" {column_type}' for col, column_type in column_types.items()
+            )
+            cursor.execute(
+                f"CREATE TABLE {FEATURES_TABLE} ({column_definitions}, PRIMARY KEY (game_id))"
+            )
+            print(f"\n+++ Created {FEATURES_TABLE} with {len(column_types)} Columns")
+            return column_types
+
+        for col, column_type in column_types.items():
+            existing_type = existing_types.get(col)
+            if existing_type is None:
+                cursor.execute(
+                    f'ALTER TABLE {FEATURES_TABLE} ADD COLUMN "{col}" {column_type}'
+                )
+                print(f"Column Added to {FEATURES_TABLE}: {col} {column_type}")
+                continue
+            stored_type = ETLPipeline._widened_type(col, existing_type, column_type)
+            if stored_type != existing_type:
+                cursor.execute(
+                    f'ALTER TABLE {FEATURES_TABLE} ALTER COLUMN "{col}" TYPE {stored_type}'
+                )
+                print(f"Column Widened in {FEATURES_TABLE}: {col} {stored_type}")
+            column_types[col] = stored_type
+        return column_types
+
+    @staticmethod
+    def _serialize_csv_chunk(df):
+        # Sparse columns (the sparse team encoding) are densified first, to_csv
+        # casts them with a deprecated sparse astype otherwise
+        sparse_columns = [
+            col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)
+        ]
+        if sparse_columns:
+            df = df.copy(deep=False)
+            for col in sparse_columns:
+                df[col] = df[col].sparse.to_dense()
+        # Missing values are written as empty unquoted fields, NULL in CSV COPY
+        return df.to_csv(
+            index=False, header=False, date_format="%Y-%m-%d %H:%M:%S"
+        ).encode()
+
+    @staticmethod
+    def _serialize_jsonb_chunk(df):
+        """
+        Serializes a chunk of rows into COPY text format lines of game_id, the
+        JSON object of all other columns, with missing values as null, and a
+        hash of that object. Keys are sorted so the hash only depends on the
+        features and their values, not on the column order.
+        Sparse columns (the sparse team encoding) are only written for rows
+        that don't hold their fill value, a missing key means the fill value.
+        """
+        sparse_columns = [
+            col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)
+        ]
+        sparse_values = [{} for _ in range(len(df))]
+        for col in sparse_columns:
+            values = df[col].array
+            set_values = values.sp_values != values.fill_value
+            for row, value in zip(
+                values.sp_index.indices[set_values].tolist(),
+                values.sp_values[set_values].tolist(),
+            ):
+                sparse_values[row][col] = value
+
+        data_columns = [
+            col for col in df.columns if col != "game_id" and col not in sparse_columns
+        ]
+        column_values = []
+        for col in data_columns:
+            if col == "game_datetime":
+                values = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+            else:
+                values = df[col]
+            # Float NaN is written as null by orjson, other missing values
+            # (None, pd.NA, NaT) need to be replaced explicitly
+            if values.dtype.kind not in "fiub":
+                values = values.astype(object).where(values.notna(), None)
+            column_values.append(values.tolist())
+
+        lines = []
+        for game_id, row, row_sparse_values in zip(
+            df["game_id"].tolist(), zip(*column_values), sparse_values
+        ):
+            data = orjson.dumps(
+                {**dict(zip(data_columns, row)), **row_sparse_values},
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS,
+            )
+            # Backslashes are the only escape character in COPY text format,
+            # tabs and newlines inside the JSON are already escaped
+            lines.append(
+                str(game_id).encode().replace(b"\\", b"\\\\")
+                + b"\t"
+                + data.replace(b"\\", b"\\\\")
+                + b"\t"
+                + hashlib.blake2b(data, digest_size=16).hexdigest().encode()
+                + b"\n"
+            )
+
+        return b"".join(lines)
+
+    @staticmethod
+    def _merge_game_to_nbastats_team(
+        game,
+        nbastats_team_dfs,
+        merge_mode="exact",
+        max_staleness_days=NBASTATS_MAX_STALENESS_DAYS,
+        output_columns=None,
+        consume_tables=False,
+    ):
+        """
+        Attaches the nbastats team features to each game, matching the stats
+        through the day before the game (to_date + 1 day) for the home and away
+        team. Each table and game set is indexed once by (merge_date, team_name)
+        and attached to the home and away side with one indexed lookup each,
+        instead of one full merge per table, side and game set.
+
+        With merge_mode="asof", each side gets the latest snapshot of its team
+        with to_date before the game day, if it is at most max_staleness_days
+        older than the exact one, so a missing snapshot day doesn't leave the
+        games of the next day without features.
+
+        With output_columns, only the features named there are attached. With
+        consume_tables, each table is removed from nbastats_team_dfs once it is
+        merged, so a caller handing the tables over doesn't hold all of them
+        until the merge ends.
+        """
+        if merge_mode not in NBASTATS_MERGE_MODES:
+            raise ValueError(f"Unknown merge mode: {merge_mode}")
+        key_columns = ["team_name", "to_date", "merge_date", "games"]
+
+        features_df = game.reset_index(drop=True)
+        game_date = features_df["game_datetime"].dt.normalize()
+        game_days = game_date.unique()
+        game_keys = {}
+        for team in ["home", "away"]:
+            game_keys[team] = pd.MultiIndex.from_arrays(
+                [game_date, features_df[f"{team}_team"]],
+                names=["merge_date", "team_name"],
+            )
+            if game_keys[team].has_duplicates:
+                raise pd.errors.MergeError(
+                    "Merge keys are not unique in left dataset; not a one-to-one merge"
+                )
+
+        if merge_mode == "asof":
+            # Teams and days as integers for the sorted per-team lookups
+            game_day_numbers = (
+                game_date.to_numpy().astype("datetime64[D]").astype(np.int64)
+            )
+            teams = pd.Index(
+                pd.unique(
+                    np.concatenate(
+                        [
+                            features_df["home_team"].astype(str).to_numpy(),
+                            features_df["away_team"].astype(str).to_numpy(),
+                        ]
+                    )
+                )
+            )
+            game_team_codes = {
+                team: teams.get_indexer(features_df[f"{team}_team"].astype(str))
+                for team in ["home", "away"]
+            }
+
+        team_blocks = []
+        for table_name in list(nbastats_team_dfs):
+            if consume_tables:
+                table = nbastats_team_dfs.pop(table_name)
+            else:
+                table = nbastats_team_dfs[table_name]
+            table_suffix = table_name.split("_")[-1]
+            value_columns = [col for col in table.columns if col not in key_columns]
+            merge_date = table["to_date"].dt.normalize() + pd.Timedelta(days=1)
+
+            # One frame per game set and the rows of it each side looks up
+            game_set_dfs = {}
+            if merge_mode == "asof":
+                team_codes = teams.get_indexer(table["team_name"].astype(str))
+                day_numbers = (
+                    merge_date.to_numpy().astype("datetime64[D]").astype(np.int64)
+                )
+                for game_set in ["all", "l2w"]:
+                    # Teams without games are never looked up
+                    mask = (team_codes >= 0) & (table["games"] == game_set).to_numpy()
+                    sub_df = table.loc[mask, value_columns].reset_index(drop=True)
+                    # Position -1 is not in the index, those rows are NaN
+                    game_set_dfs[game_set] = (
                         sub_df,
-                        left_on=["game_date", f"{team}_team"],
-                        right_on=["merge_date", "team_name"],
-                        how="left",
-                        suffixes=("", f"_{table_name}_{team}_{game_set}"),
-                        validate="1:1",
+                        ETLPipeline._asof_snapshot_positions(
+                            team_codes[mask],
+                            day_numbers[mask],
+                            game_team_codes,
+                            game_day_numbers,
+                            max_staleness_days,
+                            f"{table_name} ({game_set})",
+                        ),
                     )
+            else:
+                # Snapshots from days without games are never used
+                is_game_day = merge_date.isin(game_days).to_numpy()
+                for game_set in ["all", "l2w"]:
+                    mask = is_game_day & (table["games"] == game_set).to_numpy()
+                    sub_df = table.loc[mask, value_columns]
+                    sub_df.index = pd.MultiIndex.from_arrays(
+                        [merge_date[mask], table.loc[mask, "team_name"]],
+                        names=["merge_date", "team_name"],
+                    )
+                    if not sub_df.index.is_unique:
+                        raise pd.errors.MergeError(
+                            f"Merge keys are not unique in {table_name} ({game_set}); not a one-to-one merge"
+                        )
+                    game_set_dfs[game_set] = (sub_df, game_keys)
 
-                    # Drop the columns that were used for merging
-                    columns_to_drop = [
-                        "to_date",
-                        "merge_date",
-                        "team_name",
-                        "games",
-                    ]
+            for team in ["home", "away"]:
+                for game_set, (sub_df, lookups) in game_set_dfs.items():
+                    block_columns = {
+                        col: f"{col}_{team}_{game_set}_{table_suffix}"
+                        for col in value_columns
+                    }
+                    if output_columns is not None:
+                        block_columns = {
+                            col: name
+                            for col, name in block_columns.items()
+                            if name in output_columns
+                        }
+                        if not block_columns:
+                            continue
+                    if len(block_columns) < len(value_columns):
+                        sub_df = sub_df[list(block_columns)]
+                    team_block = sub_df.reindex(lookups[team])
+                    team_block.index = features_df.index
+                    team_block.columns = list(block_columns.values())
+                    team_blocks.append(team_block)
+            del table, merge_date, game_set_dfs
+
+        # Blocks are already aligned, concat only collects them
+        features_df = pd.concat([features_df] + team_blocks, axis=1, copy=False)
 
-                    # Check and drop only the columns that exist in the DataFrame
-                    columns_to_drop = [
-                        col for col in columns_to_drop if col in features_df.columns
-                    ]
-                    # Now, safely drop the columns
-                    features_df = features_df.drop(columns=columns_to_drop)
+        return features_df
 
-        features_df = features_df.drop(columns=["game_date"])
+    @staticmethod
+    def _asof_snapshot_positions(
+        team_codes,
+        day_numbers,
+        game_team_codes,
+        game_day_numbers,
+        max_staleness_days,
+        name,
+    ):
+        """
+        Positions of the snapshot (team_codes, day_numbers as merge dates) each
+        game side is matched to: the latest one of its team on or before the
+        game day and at most max_staleness_days older, -1 if there is none.
+        """
+        # One sorted key per snapshot, team in the high bits and day in the low
+        keys = (team_codes.astype(np.int64) << 32) | day_numbers
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        if (np.diff(sorted_keys) == 0).any():
+            raise pd.errors.MergeError(
+                f"Merge keys are not unique in {name}; not a one-to-one merge"
+            )
 
-        return features_df
+        positions = {}
+        if len(sorted_keys) == 0:
+            # No snapshots of this table and game set in the loaded window
+            for team, codes in game_team_codes.items():
+                positions[team] = np.full(len(codes), -1)
+            return positions
+
+        for team, codes in game_team_codes.items():
+            game_keys = (codes.astype(np.int64) << 32) | game_day_numbers
+            matches = np.searchsorted(sorted_keys, game_keys, side="right") - 1
+            found = matches >= 0
+            matches = np.maximum(matches, 0)
+            found &= (sorted_keys[matches] >> 32) == codes
+            found &= (game_day_numbers - (sorted_keys[matches] & 0xFFFFFFFF)) <= (
+                max_staleness_days
+            )
+            positions[team] = np.where(found, order[matches], -1)
+        return positions
 
-    def _standardize_teams_in_dataframe(self, df, table_name):
+    @staticmethod
+    def _standardize_teams_in_dataframe(df, table_name, team_map):
         possible_team_columns = [
             "home_team",
             "away_team",
@@ -300,10 +1749,10 @@ class ETLPipeline:
                 print(f"\n---No Team Columns Found for {table_name}")
                 # raise Exception(f"***No Team Columns Found for {table_name}")
             else:
-                df, info = self.standardize_team_names(
+                df, info = ETLPipeline.standardize_team_names(
                     df,
                     columns_to_standardize,
-                    self.config.TEAM_MAP,
+                    team_map,
                     filter=True,
                 )
                 if info["rows_removed"] > 0:
@@ -317,14 +1766,15 @@ class ETLPipeline:
 
         return df
 
-    def _check_duplicates(self, df, table_name):
+    @staticmethod
+    def _check_duplicates(df, table_name, primary_key):
         try:
-            primary_key = self.config.FEATURE_TABLE_INFO[table_name]["primary_key"]
-            df, info = self.check_duplicates(df, primary_key, filter=True)
+            df, info = ETLPipeline.check_duplicates(df, primary_key, filter=True)
             if info["num_non_perfect_duplicates"] > 0:
                 print(
                     f"\n***{info['num_non_perfect_duplicates']} Non-Perfect Duplicates Removed from {table_name}"
                 )
+                print("Keys:", info["non_perfect_duplicate_keys"])
                 raise Exception("Non-Perfect Duplicates")
 
         except Exception as e:
@@ -360,9 +1810,13 @@ class ETLPipeline:
         initial_rows = df.shape[0]
 
         if filter:
-            # Remove rows where the team names are not found in the mapping
+            # Remove rows where the team names are not found in the mapping,
+            # the rows are only copied if there are any
+            found = np.ones(len(df), dtype=bool)
             for column in columns:
-                df = df[df[column].isin(mapping.keys())]
+                found &= df[column].isin(mapping.keys()).to_numpy()
+            if not found.all():
+                df = df[found]
 
             # Calculate the number of rows removed
             info["rows_removed"] = initial_rows - df.shape[0]
@@ -380,23 +1834,43 @@ class ETLPipeline:
 
     @staticmethod
     def check_duplicates(df, primary_key, filter=False, print_details=False):
+        """
+        Counts the rows sharing their primary key with another row, the rows
+        that are exact copies of another row, and the rest (non-perfect
+        duplicates), whose keys are listed in non_perfect_duplicate_keys.
+        Keys are hashed once and only rows with a duplicated key are hashed
+        on all columns, since a perfect duplicate also repeats its key. Rows
+        whose hashes collide are compared exactly.
+        """
         # if primary_key is a single string, make it a list
         if isinstance(primary_key, str):
             primary_key = [primary_key]
 
-        # Check for duplicates based on primary keys
-        duplicate_keys_df = df[df.duplicated(subset=primary_key, keep=False)]
-        num_duplicate_keys = len(duplicate_keys_df)
+        # Rows sharing a primary key
+        key_duplicates = ETLPipeline._duplicated_rows(df, primary_key)
+        num_duplicate_keys = int(key_duplicates.sum())
 
-        # Check for perfect duplicates
-        perfect_duplicates_df = df[df.duplicated(keep=False)]
-        num_perfect_duplicates = len(perfect_duplicates_df)
+        # Perfect duplicates, only looked for among the rows sharing a key
+        perfect_duplicates = np.zeros(len(df), dtype=bool)
+        if num_duplicate_keys > 0:
+            key_duplicate_positions = np.flatnonzero(key_duplicates)
+            perfect_duplicates[key_duplicate_positions] = ETLPipeline._duplicated_rows(
+                df.iloc[key_duplicate_positions], list(df.columns)
+            )
+        num_perfect_duplicates = int(perfect_duplicates.sum())
 
         # Calculate the number of non-perfect duplicates
         num_non_perfect_duplicates = num_duplicate_keys - num_perfect_duplicates
+        non_perfect_keys = df.loc[
+            key_duplicates & ~perfect_duplicates, primary_key
+        ].drop_duplicates()
+        if len(primary_key) == 1:
+            non_perfect_keys = non_perfect_keys[primary_key[0]].tolist()
+        else:
+            non_perfect_keys = list(non_perfect_keys.itertuples(index=False, name=None))
 
         # Filter to remove all duplicates based on the primary key if required
-        if filter:
+        if filter and num_duplicate_keys > 0:
             df = df.drop_duplicates(subset=primary_key, keep="first")
 
         # Create the info dictionary
@@ -404,6 +1878,7 @@ class ETLPipeline:
             "num_duplicate_keys": num_duplicate_keys,
             "num_perfect_duplicates": num_perfect_duplicates,
             "num_non_perfect_duplicates": num_non_perfect_duplicates,
+            "non_perfect_duplicate_keys": non_perfect_keys,
         }
 
         if print_details:
@@ -416,38 +1891,102 @@ class ETLPipeline:
             return df, info
 
     @staticmethod
-    def downcast_data_types(df, downcast_floats=True, print_details=False):
-        # Function to convert 'None' to 'NaN'
-        def none_to_nan(x):
-            return x.apply(lambda elem: np.nan if elem is None else elem)
+    def _row_hashes(df):
+        """
+        One uint64 hash of the values of every row of df, equal for rows with
+        equal values.
+        """
+        float_columns = df.select_dtypes("floating").columns
+        if len(float_columns) > 0:
+            # Hashes are taken on the bits, -0.0 and NaN payloads made canonical
+            df = df.assign(
+                **{
+                    col: np.where(df[col].isna(), np.nan, df[col] + 0.0)
+                    for col in float_columns
+                }
+            )
+        return pd.util.hash_pandas_object(df, index=False).to_numpy()
 
+    @staticmethod
+    def _duplicated_rows(df, columns):
+        # Same as df.duplicated(subset=columns, keep=False), from one uint64 hash
+        # per row, with the rows whose hashes repeat checked exactly
+        row_hashes = ETLPipeline._row_hashes(df[columns])
+        duplicated = pd.Series(row_hashes).duplicated(keep=False).to_numpy()
+        if duplicated.any():
+            candidates = np.flatnonzero(duplicated)
+            duplicated[candidates] = (
+                df[columns].iloc[candidates].duplicated(keep=False).to_numpy()
+            )
+        return duplicated
+
+    @staticmethod
+    def downcast_data_types(
+        df,
+        downcast_floats=True,
+        print_details=False,
+        downcast_ints=False,
+        report_memory=True,
+    ):
+        """
+        Converts None to NaN in object columns and downcasts numeric columns
+        with one astype over the target schema. Floats become float32 when
+        every value survives the cast within pandas' to_numeric tolerance
+        (5e-4). Integers without missing values get the smallest signed type
+        that fits. Memory usage is only measured if report_memory is True.
+        """
         # Information about memory usage
         info = {}
-        mem_used_before = round(df.memory_usage(deep=True).sum() / 1024**2, 2)
-        info["Before"] = {
-            "Total (MB)": mem_used_before,
-            "By Type (MB)": round(
-                df.memory_usage(deep=True).groupby([df.dtypes]).sum() / 1024**2, 2
-            ),
-        }
+        if report_memory:
+            mem_used_before, info["Before"] = ETLPipeline._memory_usage_info(df)
 
-        # Convert 'None' to 'NaN' across the entire DataFrame
-        df = df.apply(none_to_nan)
+        # Convert 'None' to 'NaN', object columns are the only ones holding None
+        object_cols = df.columns[df.dtypes == object]
+        if len(object_cols) > 0:
+            df = df.copy(deep=False)
+            for col in object_cols:
+                df[col] = df[col].where(df[col].notna(), np.nan).infer_objects()
+
+        target_dtypes = {}
 
         # Downcasting floats if required
         if downcast_floats:
-            float_cols = df.select_dtypes(include=["float"]).columns
-            df[float_cols] = df[float_cols].apply(
-                lambda x: pd.to_numeric(x, downcast="float")
-            )
-
-        mem_used_after = round(df.memory_usage(deep=True).sum() / 1024**2, 2)
-        info["After"] = {
-            "Total (MB)": mem_used_after,
-            "By Type (MB)": round(
-                df.memory_usage(deep=True).groupby([df.dtypes]).sum() / 1024**2, 2
-            ),
-        }
+            # One column at a time, the check needs a few temporary copies
+            for col in df.columns[df.dtypes == np.float64]:
+                values = df[col].to_numpy()
+                if np.isclose(
+                    values.astype(np.float32),
+                    values,
+                    rtol=0.0,
+                    atol=5e-4,
+                    equal_nan=True,
+                ).all():
+                    target_dtypes[col] = np.float32
+
+        # Downcasting integers if required
+        if downcast_ints:
+            int_cols = df.select_dtypes(include=["integer"]).columns
+            if len(int_cols) > 0:
+                col_min = df[int_cols].min()
+                col_max = df[int_cols].max()
+                for col in int_cols:
+                    for dtype in [np.int8, np.int16, np.int32]:
+                        if (
+                            col_min[col] >= np.iinfo(dtype).min
+                            and col_max[col] <= np.iinfo(dtype).max
+                        ):
+                            if np.dtype(dtype).itemsize < df[col].dtype.itemsize:
+                                target_dtypes[col] = dtype
+                            break
+
+        if target_dtypes:
+            # Columns that keep their dtype are not copied first
+            df = df.astype(target_dtypes, copy=False)
+
+        if not report_memory:
+            return df if print_details else (df, info)
+
+        mem_used_after, info["After"] = ETLPipeline._memory_usage_info(df)
 
         savings = round(mem_used_before - mem_used_after, 2)
         savings_pct = round(
@@ -463,6 +2002,18 @@ class ETLPipeline:
         else:
             return df, info
 
+    @staticmethod
+    def _memory_usage_info(df):
+        memory_usage = df.memory_usage(deep=True)
+        mem_used = round(memory_usage.sum() / 1024**2, 2)
+        return mem_used, {
+            "Total (MB)": mem_used,
+            # Grouped by name, dtype objects of categoricals don't sort with numpy's
+            "By Type (MB)": round(
+                memory_usage.groupby(df.dtypes.astype(str)).sum() / 1024**2, 2
+            ),
+        }
+
     @staticmethod
     def get_merge_statistics(merged_df, indicator_column="_merge"):
         # Total number of records in the merged dataframe
@@ -492,23 +2043,7 @@ class ETLPipeline:
 
 if __name__ == "__main__":
     start_date = "2020-09-01"
-    ETL = ETLPipeline(start_date)
-
-    ETL.load_features_data(
-        [
-            "team_nbastats_general_traditional",
-            "team_nbastats_general_advanced",
-            "team_nbastats_general_fourfactors",
-            "team_nbastats_general_opponent",
-        ]
-    )
-
-    ETL.prepare_all_tables()
-
-    ETL.feature_creation_pre_merge()
-
-    ETL.merge_features_data()
-
-    ETL.feature_creation_post_merge()
+    ETL = ETLPipeline(start_date, post_merge_workers=os.cpu_count())
 
-    ETL.clean_and_save_combined_features()
+    # Full rebuilds go season by season to keep memory bounded
+    ETL.run_streaming()
@@ -0,0 +1,172 @@
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import psutil
+
+
+def _frames(value):
+    if isinstance(value, pd.DataFrame):
+        return [value]
+    if isinstance(value, dict):
+        return [frame for v in value.values() for frame in _frames(v)]
+    return []
+
+
+def frame_shape(value):
+    """
+    Row and column counts of a DataFrame, or totals over the DataFrames in a
+    (nested) dict.
+    """
+    if isinstance(value, pd.DataFrame):
+        return {"rows": value.shape[0], "columns": value.shape[1]}
+    if isinstance(value, dict):
+        frames = _frames(value)
+        return {
+            "tables": len(frames),
+            "rows": sum(frame.shape[0] for frame in frames),
+            "columns": sum(frame.shape[1] for frame in frames),
+        }
+    return None
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss / 1024**2
+    return max_rss / 1024
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, memory (RSS, process peak RSS and the
+    tracemalloc peak) and the input and output shapes of ETL stages. Stages
+    can be nested, a feature creation method inside the post_merge stage is
+    recorded as post_merge/<method>. With cprofile_dir, top level stages are
+    also run under cProfile and their stats dumped to <stage>.prof.
+    A disabled profiler only runs the code.
+    """
+
+    def __init__(self, enabled=True, trace_memory=True, cprofile_dir=None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.cprofile_dir = cprofile_dir
+        self.process = psutil.Process()
+        self.records = []
+        self._stack = []
+        self._started_tracing = False
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+
+    @contextmanager
+    def stage(self, name, inputs=None):
+        """
+        Profiles the body of the with block. The yielded record takes the
+        stage output with record["outputs"] = df (or a dict of DataFrames).
+        """
+        record = {}
+        # Only the shapes are kept, the stage may release its inputs
+        input_shapes = frame_shape(inputs) if self.enabled else None
+        del inputs
+        if not self.enabled:
+            yield record
+            return
+
+        path = f"{self._stack[-1]['stage']}/{name}" if self._stack else name
+        record.update({"stage": path, "inputs": input_shapes})
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            traced_start, traced_peak = tracemalloc.get_traced_memory()
+            # Keep the peak of the enclosing stage before resetting it for this one
+            if self._stack:
+                parent = self._stack[-1]
+                parent["_traced_peak"] = max(parent["_traced_peak"], traced_peak)
+            tracemalloc.reset_peak()
+            record["_traced_start"] = traced_start
+            record["_traced_peak"] = traced_start
+
+        profiler = None
+        if self.cprofile_dir is not None and not self._stack:
+            # cProfile can't be nested, only top level stages are profiled
+            profiler = cProfile.Profile()
+
+        self._stack.append(record)
+        rss_start = self.process.memory_info().rss
+        max_rss_start = _max_rss_mb()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = repr(e)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            self._stack.pop()
+
+            record["wall_time_s"] = round(wall_time, 4)
+            record["cpu_time_s"] = round(cpu_time, 4)
+            record["outputs"] = frame_shape(record.get("outputs"))
+            record["rss_mb"] = round(self.process.memory_info().rss / 1024**2, 2)
+            record["rss_delta_mb"] = round(
+                (self.process.memory_info().rss - rss_start) / 1024**2, 2
+            )
+            record["max_rss_mb"] = round(_max_rss_mb(), 2)
+            record["max_rss_increase_mb"] = round(_max_rss_mb() - max_rss_start, 2)
+
+            if self.trace_memory:
+                _, traced_peak = tracemalloc.get_traced_memory()
+                traced_peak = max(record.pop("_traced_peak"), traced_peak)
+                record["tracemalloc_peak_mb"] = round(
+                    (traced_peak - record.pop("_traced_start")) / 1024**2, 2
+                )
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent["_traced_peak"] = max(parent["_traced_peak"], traced_peak)
+                elif self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+            if profiler is not None:
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                record["cprofile_path"] = os.path.join(
+                    os.path.abspath(self.cprofile_dir), f"{name}.prof"
+                )
+                profiler.dump_stats(record["cprofile_path"])
+
+            self.records.append(record)
+
+    def report(self, **metadata):
+        return {"started_at": self.started_at, **metadata, "stages": self.records}
+
+    def save(self, path, **metadata):
+        """
+        Writes the records as JSON, metadata (run_id, ...) is added at the top.
+        """
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(self.report(**metadata), f, indent=4, default=str)
+            print("\n+++ Stage Profile Saved:", path)
+        except Exception as e:
+            print("\n*** Error Saving Stage Profile")
+            raise e
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,284 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Boolean, Integer
+
+here = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(here, "../.."))
+
+import config
+from src.utils.general_utils import SEASON_CALENDAR, apply_categorical_vocabulary
+
+from .main_etl import NBASTATS_TEAM_TABLES, ORM_PANDAS_DTYPES, ETLPipeline
+
+# Offline stand-ins for the games and nbastats team tables, shaped and typed
+# like ETLPipeline.load_table returns them, for benchmarks and local runs
+
+L2W_DAYS = 14
+
+# Location and spread of the synthetic feature values by column name
+FEATURE_SCALES = [
+    ("_pct", 0.45, 0.05),
+    ("_rate", 0.25, 0.04),
+    ("net_rating", 0.0, 5.0),
+    ("rating", 112.0, 5.0),
+    ("pace", 99.0, 3.0),
+    ("poss", 99.0, 3.0),
+    ("ast_to", 1.7, 0.2),
+    ("ast_ratio", 17.0, 2.0),
+    ("pie", 0.5, 0.04),
+    ("plus_minus", 0.0, 6.0),
+    ("min", 48.3, 0.4),
+    ("pts", 112.0, 6.0),
+    ("3a", 34.0, 4.0),
+    ("3m", 12.0, 2.0),
+    ("fga", 88.0, 4.0),
+    ("fgm", 41.0, 3.0),
+]
+
+
+def _feature_scale(col):
+    for pattern, loc, scale in FEATURE_SCALES:
+        if pattern in col:
+            return loc, scale
+    return 20.0, 4.0
+
+
+def _full_team_names():
+    # nbastats tables use full names, the current one is listed first
+    full_names = {}
+    for name, team in config.TEAM_FULL_NAME_MAP.items():
+        full_names.setdefault(team, name)
+    return full_names
+
+
+def _to_orm_dtypes(df, table_name, date_column):
+    # Same dtype rules as ETLPipeline.load_table
+    schema = ETLPipeline._table_schema(table_name, date_column, list(df.columns))
+    for col, column_type in schema:
+        has_nulls = df[col].isna().any()
+        if column_type is Integer:
+            dtype = "float64" if has_nulls else "int64"
+        elif column_type is Boolean:
+            dtype = "object" if has_nulls else "bool"
+        else:
+            dtype = ORM_PANDAS_DTYPES.get(column_type, "object")
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def synthetic_seasons(num_seasons, last_season=None):
+    seasons = list(config.NBA_IMPORTANT_DATES)
+    end = len(seasons) if last_season is None else seasons.index(last_season) + 1
+    if num_seasons > end:
+        raise ValueError(f"Only {end} seasons available up to {seasons[end - 1]}")
+    return seasons[end - num_seasons : end]
+
+
+def synthetic_games(num_seasons, seed=0, last_season=None, num_upcoming=30):
+    """
+    Games of the last num_seasons seasons (up to last_season) for the 30
+    teams: about 7 regular season games a day, playoff games between the 16
+    teams with the most wins, scores driven by a season strength per team and
+    a home advantage, and open lines from the strength difference. The last
+    num_upcoming games are not completed yet and have no scores.
+    """
+    rng = np.random.default_rng(seed)
+    teams = np.array(sorted(config.VALID_TEAM_ABBREVIATIONS))
+
+    games = []
+    for season in synthetic_seasons(num_seasons, last_season):
+        dates = config.NBA_IMPORTANT_DATES[season]
+        strength = rng.normal(0, 4, len(teams))
+        wins = np.zeros(len(teams), dtype=int)
+
+        days = [
+            (day, teams.size, (3, 12))
+            for day in pd.date_range(
+                dates["reg_season_start_date"], dates["reg_season_end_date"]
+            )
+        ]
+        playoff_days = pd.date_range(
+            dates["postseason_start_date"], dates["postseason_end_date"]
+        )
+        for day in playoff_days[::2]:
+            # Fewer teams left as the playoffs go on
+            progress = (day - playoff_days[0]) / (playoff_days[-1] - playoff_days[0])
+            days.append((day, 16, (1, max(2, int(8 * (1 - progress))))))
+
+        for day, num_teams, num_games in days:
+            pool = np.argsort(-wins, kind="stable")[:num_teams]
+            matchups = rng.permutation(pool)[: 2 * rng.integers(*num_games)]
+            for home, away in matchups.reshape(-1, 2):
+                expected_margin = strength[home] - strength[away] + 2.5
+                home_score = int(rng.normal(112 + expected_margin / 2, 11))
+                away_score = int(rng.normal(112 - expected_margin / 2, 11))
+                if home_score == away_score:
+                    home_score += 1
+                wins[home if home_score > away_score else away] += 1
+
+                game_datetime = day + pd.Timedelta(
+                    hours=int(rng.integers(17, 23)), minutes=int(rng.choice([0, 30]))
+                )
+                games.append(
+                    {
+                        "game_id": game_datetime.strftime("%Y%m%d")
+                        + teams[home]
+                        + teams[away],
+                        "game_datetime": game_datetime,
+                        "home_team": teams[home],
+                        "away_team": teams[away],
+                        "open_line": np.round(
+                            2 * (-expected_margin + rng.normal(0, 1.5))
+                        )
+                        / 2,
+                        "home_score": home_score,
+                        "away_score": away_score,
+                        "game_completed": True,
+                    }
+                )
+
+    game = pd.DataFrame(games).sort_values("game_datetime", ignore_index=True)
+    if num_upcoming > 0:
+        upcoming = game.index[-num_upcoming:]
+        game["home_score"] = game["home_score"].astype("float64")
+        game["away_score"] = game["away_score"].astype("float64")
+        game.loc[upcoming, ["home_score", "away_score"]] = np.nan
+        game.loc[upcoming, "game_completed"] = False
+
+    return _to_orm_dtypes(game, "games", "game_datetime")
+
+
+def synthetic_nbastats_team_tables(
+    game, table_names=NBASTATS_TEAM_TABLES, seed=0, missing_fraction=0.005
+):
+    """
+    Daily snapshots of the nbastats team tables for the seasons in game, for
+    the all and l2w (last two weeks) game sets. gp, w, l and w_pct are counted
+    from the completed games up to to_date, other features are drawn around
+    a season level per team. Teams without games in a set have no row, like
+    in the scraped tables, and missing_fraction of the values are null.
+    """
+    rng = np.random.default_rng(seed)
+    teams = np.array(sorted(config.VALID_TEAM_ABBREVIATIONS))
+    team_positions = {team: position for position, team in enumerate(teams)}
+    full_names = _full_team_names()
+
+    completed = game.loc[game["game_completed"].astype(bool)]
+    positions = SEASON_CALENDAR.season_positions(completed["game_datetime"])
+    seasons = pd.Series(SEASON_CALENDAR.seasons[positions], index=completed.index)
+
+    # Wins and losses per team and day, by season
+    snapshots = []
+    for season, season_games in completed.groupby(seasons, sort=True):
+        dates = config.NBA_IMPORTANT_DATES[season]
+        days = pd.date_range(
+            dates["reg_season_start_date"],
+            season_games["game_datetime"].max().normalize(),
+        )
+        day_positions = (
+            season_games["game_datetime"].dt.normalize() - days[0]
+        ).dt.days.to_numpy()
+        home = season_games["home_team"].map(team_positions).to_numpy()
+        away = season_games["away_team"].map(team_positions).to_numpy()
+        home_won = (season_games["home_score"] > season_games["away_score"]).to_numpy()
+
+        wins = np.zeros((len(days), len(teams)), dtype=np.int64)
+        losses = np.zeros((len(days), len(teams)), dtype=np.int64)
+        np.add.at(wins, (day_positions, np.where(home_won, home, away)), 1)
+        np.add.at(losses, (day_positions, np.where(home_won, away, home)), 1)
+        wins_all, losses_all = wins.cumsum(axis=0), losses.cumsum(axis=0)
+        wins_l2w = (
+            wins_all
+            - np.vstack(
+                [np.zeros((L2W_DAYS, len(teams)), dtype=np.int64), wins_all[:-L2W_DAYS]]
+            )[: len(days)]
+        )
+        losses_l2w = (
+            losses_all
+            - np.vstack(
+                [
+                    np.zeros((L2W_DAYS, len(teams)), dtype=np.int64),
+                    losses_all[:-L2W_DAYS],
+                ]
+            )[: len(days)]
+        )
+
+        for games_set, w, l in [
+            ("all", wins_all, losses_all),
+            ("l2w", wins_l2w, losses_l2w),
+        ]:
+            snapshots.append(
+                pd.DataFrame(
+                    {
+                        "season": season,
+                        "team": np.tile(np.arange(len(teams)), len(days)),
+                        "to_date": np.repeat(days.to_numpy(), len(teams)),
+                        "games": games_set,
+                        "w": w.ravel(),
+                        "l": l.ravel(),
+                    }
+                )
+            )
+    snapshot = pd.concat(snapshots, ignore_index=True)
+    snapshot = snapshot.loc[snapshot["w"] + snapshot["l"] > 0]
+    snapshot = snapshot.sort_values(["to_date", "team", "games"], ignore_index=True)
+    snapshot["gp"] = snapshot["w"] + snapshot["l"]
+
+    season_codes = snapshot["season"].astype("category").cat.codes.to_numpy()
+    num_rows = len(snapshot)
+    nbastats_team_dfs = {}
+    for table_name in table_names:
+        table_info = config.FEATURE_TABLE_INFO[table_name]
+        table = pd.DataFrame(
+            {
+                "team_name": teams[snapshot["team"].to_numpy()],
+                "to_date": snapshot["to_date"].to_numpy(),
+                "games": snapshot["games"].to_numpy(),
+            }
+        )
+        table["team_name"] = table["team_name"].map(full_names)
+
+        # Season level of every team, snapshots vary around it, l2w more so
+        noise_scale = np.where(snapshot["games"] == "all", 0.3, 0.8)
+        for col in table_info["feature_columns"]:
+            if col in ["gp", "w", "l"]:
+                table[col] = snapshot[col].to_numpy()
+                continue
+            if col == "w_pct":
+                values = np.round(snapshot["w"] / snapshot["gp"], 3).to_numpy()
+            else:
+                loc, scale = _feature_scale(col)
+                team_level = rng.normal(0, 1, (season_codes.max() + 1, len(teams)))
+                values = loc + scale * (
+                    team_level[season_codes, snapshot["team"].to_numpy()]
+                    + noise_scale * rng.normal(0, 1, num_rows)
+                )
+                values = np.round(values, 3 if scale < 1 else 1)
+            values[rng.random(num_rows) < missing_fraction] = np.nan
+            table[col] = values
+
+        nbastats_team_dfs[table_name] = _to_orm_dtypes(
+            table, table_name, table_info["date_column"]
+        )
+
+    return nbastats_team_dfs
+
+
+def synthetic_etl_inputs(num_seasons, seed=0, last_season=None, num_upcoming=30):
+    """
+    Games and raw nbastats team tables for num_seasons seasons, what the
+    ETLPipeline loads from the database.
+    """
+    game = synthetic_games(
+        num_seasons, seed=seed, last_season=last_season, num_upcoming=num_upcoming
+    )
+    nbastats_team_dfs = synthetic_nbastats_team_tables(game, seed=seed)
+    # Teams are categorical once loaded, see ETLPipeline.load_game_data
+    return apply_categorical_vocabulary(game), nbastats_team_dfs
+
+
+if __name__ == "__main__":
+    pass
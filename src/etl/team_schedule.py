@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from numba import njit
+
+NANOSECONDS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+class TeamScheduleIndex:
+    """
+    Team-games of a set of games sorted by (season, team, datetime), one entry
+    per side of each game. offsets delimits the games of every team-season
+    (CSR layout) and game_row / is_home point each entry back to its game, so
+    per-team history features are array passes over the entries, mapped back
+    to the home and away columns with to_games.
+
+    Team and season codes are any integer codes, -1 for missing values. Sides
+    with a missing team or season have no entry and get NaN in to_games.
+    """
+
+    def __init__(self, game_datetime, season_codes, home_team_codes, away_team_codes):
+        game_datetime = np.asarray(game_datetime, dtype="datetime64[ns]")
+        self.num_games = len(game_datetime)
+
+        # Long layout: home sides of all games first, then away sides
+        team_codes = np.concatenate([home_team_codes, away_team_codes])
+        season_codes = np.tile(season_codes, 2)
+        timestamps = np.tile(game_datetime.view(np.int64), 2)
+        team_game = np.arange(2 * self.num_games)
+
+        valid = np.flatnonzero((team_codes >= 0) & (season_codes >= 0))
+        order = valid[
+            np.lexsort(
+                (
+                    team_game[valid],
+                    timestamps[valid],
+                    team_codes[valid],
+                    season_codes[valid],
+                )
+            )
+        ]
+
+        self.team_game = order
+        self.game_row = order % max(self.num_games, 1)
+        self.is_home = order < self.num_games
+        self.team_codes = team_codes[order]
+        self.season_codes = season_codes[order]
+        self.game_datetime = game_datetime[self.game_row]
+
+        self.segment_starts = np.ones(len(order), dtype=bool)
+        self.segment_starts[1:] = (self.team_codes[1:] != self.team_codes[:-1]) | (
+            self.season_codes[1:] != self.season_codes[:-1]
+        )
+        self.offsets = np.append(np.flatnonzero(self.segment_starts), len(order))
+        # Position where the team-season of every entry begins
+        self.segment_start = np.repeat(self.offsets[:-1], np.diff(self.offsets))
+
+    @classmethod
+    def from_games(cls, df):
+        """
+        Index of the games in df (game_datetime, season, home_team, away_team),
+        game_row being the position in df.
+        """
+        team_codes, _ = pd.factorize(
+            pd.concat([df["home_team"], df["away_team"]], ignore_index=True)
+        )
+        season_codes, _ = pd.factorize(df["season"])
+        return cls(
+            df["game_datetime"].to_numpy(dtype="datetime64[ns]"),
+            season_codes,
+            team_codes[: len(df)],
+            team_codes[len(df) :],
+        )
+
+    @property
+    def num_segments(self):
+        return len(self.offsets) - 1
+
+    def from_sides(self, home_values, away_values):
+        """Per-game home and away values as team-game values."""
+        return np.concatenate([home_values, away_values])[self.team_game]
+
+    def to_games(self, values):
+        """Team-game values as per-game (home, away) arrays."""
+        games = []
+        for side_mask in [self.is_home, ~self.is_home]:
+            side_values = np.full(self.num_games, np.nan)
+            side_values[self.game_row[side_mask]] = values[side_mask]
+            games.append(side_values)
+        return tuple(games)
+
+    def days_since_previous_game(self):
+        """Whole days since the team's previous game of the season."""
+        days = np.full(len(self.team_game), np.nan)
+        if len(days) > 1:
+            elapsed = np.diff(self.game_datetime.view(np.int64))
+            days[1:] = elapsed // NANOSECONDS_PER_DAY
+            days[1:][
+                np.isnat(self.game_datetime[1:]) | np.isnat(self.game_datetime[:-1])
+            ] = np.nan
+        days[self.segment_starts] = np.nan
+        return days
+
+    def shift(self, values):
+        """Value of the team's previous game of the season, NaN for the first."""
+        shifted = np.empty_like(values)
+        shifted[0:1] = np.nan
+        shifted[1:] = values[:-1]
+        shifted[self.segment_starts] = np.nan
+        return shifted
+
+    def rolling_sum(self, values, window, min_periods):
+        # NaN values are skipped, like pandas rolling().sum()
+        observed = ~np.isnan(values)
+        value_sums = np.concatenate([[0.0], np.cumsum(np.where(observed, values, 0))])
+        observed_counts = np.concatenate([[0], np.cumsum(observed)])
+        positions = np.arange(len(values))
+        window_start = np.maximum(self.segment_start, positions - window + 1)
+        sums = value_sums[positions + 1] - value_sums[window_start]
+        counts = observed_counts[positions + 1] - observed_counts[window_start]
+        return np.where(counts >= min_periods, sums, np.nan)
+
+    def expanding_mean(self, values):
+        # NaN values are skipped, like pandas expanding().mean()
+        observed = ~np.isnan(values)
+        value_sums = np.concatenate([[0.0], np.cumsum(np.where(observed, values, 0))])
+        observed_counts = np.concatenate([[0], np.cumsum(observed)])
+        positions = np.arange(len(values))
+        sums = value_sums[positions + 1] - value_sums[self.segment_start]
+        counts = observed_counts[positions + 1] - observed_counts[self.segment_start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def streaks(self, performance):
+        """
+        Streak entering each team-game: positive for consecutive wins, negative
+        for consecutive losses. Games in progress (performance 0) leave the
+        streak unchanged.
+        """
+        return _team_streaks(performance, self.segment_starts)
+
+
+@njit(cache=True)
+def _team_streaks(performance, segment_starts):
+    streaks = np.empty(performance.shape[0], dtype=np.float64)
+    current_streak = 0.0
+    for i in range(performance.shape[0]):
+        if segment_starts[i]:
+            current_streak = 0.0
+        streaks[i] = current_streak
+
+        performance_i = performance[i]
+        if performance_i == 0:
+            continue
+
+        if current_streak == 0:
+            current_streak = performance_i
+        elif np.sign(current_streak) == np.sign(performance_i):
+            current_streak += performance_i
+        else:
+            current_streak = performance_i
+    return streaks
+
+
+if __name__ == "__main__":
+    pass
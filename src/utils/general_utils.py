@@ -2,12 +2,13 @@ import os
 import sys
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 
 here = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(here, "../.."))
-from config import NBA_IMPORTANT_DATES
+from config import NBA_IMPORTANT_DATES, TEAM_MAP
 
 load_dotenv()
 DB_ENDPOINT = os.environ.get("DB_ENDPOINT")
@@ -18,93 +19,225 @@ ZYTE_API_KEY = os.environ.get("ZYTE_API_KEY")
 from datetime import datetime
 
 
-def find_season_information(date_str):
-    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-
-    # Iterate over each season
-    for season, info in NBA_IMPORTANT_DATES.items():
-        reg_season_start_date = datetime.strptime(
-            info["reg_season_start_date"], "%Y-%m-%d"
+class SeasonCalendar:
+    """
+    Season boundaries from NBA_IMPORTANT_DATES, parsed once into sorted
+    datetime64 arrays. A date belongs to the season whose regular season start
+    is the latest one on or before it, as long as it is not after that season's
+    postseason end. Lookups work on single dates and on whole Series.
+    """
+
+    SEASON_TYPES = np.array(["Regular Season", "Other", "Playoffs"], dtype=object)
+
+    def __init__(self, important_dates=NBA_IMPORTANT_DATES):
+        self.important_dates = important_dates
+        self.seasons = np.array(
+            sorted(
+                important_dates,
+                key=lambda season: important_dates[season]["reg_season_start_date"],
+            ),
+            dtype=object,
         )
-        reg_season_end_date = datetime.strptime(info["reg_season_end_date"], "%Y-%m-%d")
-        postseason_start_date = datetime.strptime(
-            info["postseason_start_date"], "%Y-%m-%d"
+        for boundary in [
+            "reg_season_start_date",
+            "reg_season_end_date",
+            "postseason_start_date",
+            "postseason_end_date",
+        ]:
+            setattr(
+                self,
+                boundary + "s",
+                np.array(
+                    [important_dates[season][boundary] for season in self.seasons],
+                    dtype="datetime64[D]",
+                ),
+            )
+
+    def season_positions(self, dates):
+        """
+        Position of each date's season in self.seasons, -1 outside all seasons.
+        Dates are compared by day.
+        """
+        days = np.asarray(dates, dtype="datetime64[D]")
+        positions = np.searchsorted(self.reg_season_start_dates, days, side="right") - 1
+        in_season = (positions >= 0) & (
+            days <= self.postseason_end_dates[np.maximum(positions, 0)]
         )
-        postseason_end_date = datetime.strptime(info["postseason_end_date"], "%Y-%m-%d")
-
-        # Check if date_obj falls within this season's regular or postseason
-        if reg_season_start_date <= date_obj <= postseason_end_date:
-            season_info = {
-                "date": date_str,
-                "season": season,
-                "year1": season.split("-")[0],  # Getting the first part of the season
-                "year2": season.split("-")[1],  # Getting the second part of the season
-                "reg_season_start_date": info["reg_season_start_date"],
-                "reg_season_end_date": info["reg_season_end_date"],
-                "postseason_start_date": info["postseason_start_date"],
-                "postseason_end_date": info["postseason_end_date"],
-            }
-
-            # Determine whether it's the regular season or playoffs
-            if reg_season_start_date <= date_obj <= reg_season_end_date:
-                season_info["season_type"] = "Regular Season"
-            elif postseason_start_date <= date_obj <= postseason_end_date:
-                season_info["season_type"] = "Playoffs"
-            else:
-                season_info["season_type"] = "Other"
-
-            return season_info
-
-    # If no matching season is found, raise an error
-    raise ValueError(f"Could not find season information for date: {date_str}.")
+        return np.where(in_season, positions, -1)
+
+    def find(self, date_str):
+        position = self.season_positions([date_str])[0]
+        if position < 0:
+            raise ValueError(f"Could not find season information for date: {date_str}.")
+
+        season = self.seasons[position]
+        info = self.important_dates[season]
+        season_info = {
+            "date": date_str,
+            "season": season,
+            "year1": season.split("-")[0],  # Getting the first part of the season
+            "year2": season.split("-")[1],  # Getting the second part of the season
+            "reg_season_start_date": info["reg_season_start_date"],
+            "reg_season_end_date": info["reg_season_end_date"],
+            "postseason_start_date": info["postseason_start_date"],
+            "postseason_end_date": info["postseason_end_date"],
+            "season_type": self._season_types(
+                np.array([date_str], dtype="datetime64[D]"), np.array([position])
+            )[0],
+        }
+        return season_info
+
+    def lookup(self, dates):
+        """
+        Season, season_type and reg_season_start_date for every date in a
+        Series or array of datetimes. Raises a ValueError listing the dates
+        outside all seasons.
+        """
+        index = dates.index if isinstance(dates, pd.Series) else None
+        days = np.asarray(dates, dtype="datetime64[D]")
+        positions = self.season_positions(days)
+
+        missing = positions < 0
+        if missing.any():
+            missing_dates = np.unique(days[missing]).astype(str)
+            raise ValueError(
+                f"Could not find season information for dates: {list(missing_dates)}."
+            )
 
+        return pd.DataFrame(
+            {
+                "season": self.seasons[positions],
+                "season_type": self._season_types(days, positions),
+                "reg_season_start_date": self.reg_season_start_dates[positions].astype(
+                    "datetime64[ns]"
+                ),
+            },
+            index=index,
+        )
 
-def determine_season_type(date, important_dates):
-    date = pd.to_datetime(date)
-    day_of_week = date.dayofweek  # Day of week as an integer (Monday=0, Sunday=6)
-    month = date.month  # Month as January=1, December=12
-
-    for season, dates in important_dates.items():
-        reg_start_date = pd.to_datetime(dates["reg_season_start_date"])
-        reg_end_date = pd.to_datetime(dates["reg_season_end_date"])
-        post_start_date = pd.to_datetime(dates["postseason_start_date"])
-        post_end_date = pd.to_datetime(dates["postseason_end_date"])
-
-        if reg_start_date <= date <= reg_end_date:
-            month_of_season = (
-                date.to_period("M") - reg_start_date.to_period("M")
-            ).n + 1
-            week_of_season = (
-                date.to_period("W-SUN") - reg_start_date.to_period("W-SUN")
-            ).n + 1
-            return pd.Series(
-                [season, "reg", day_of_week, month, month_of_season, week_of_season]
+    def timeframe_info(self, datetimes):
+        """
+        Season, season type ("reg" or "post"), day_of_week, month,
+        month_of_season and week_of_season (weeks ending on Sunday) for every
+        datetime in a Series. Full datetimes are compared with the midnight
+        season boundaries, later times on the last day of a phase fall outside
+        of it. Rows outside all seasons are None/NaN.
+        """
+        index = datetimes.index if isinstance(datetimes, pd.Series) else None
+        times = np.asarray(datetimes, dtype="datetime64[ns]")
+        reg_starts = self.reg_season_start_dates.astype("datetime64[ns]")
+        post_starts = self.postseason_start_dates.astype("datetime64[ns]")
+
+        positions = np.searchsorted(reg_starts, times, side="right") - 1
+        safe_positions = np.maximum(positions, 0)
+        in_reg = (positions >= 0) & (
+            times <= self.reg_season_end_dates[safe_positions].astype("datetime64[ns]")
+        )
+        in_post = (
+            (positions >= 0)
+            & ~in_reg
+            & (times >= post_starts[safe_positions])
+            & (
+                times
+                <= self.postseason_end_dates[safe_positions].astype("datetime64[ns]")
             )
-        elif post_start_date <= date <= post_end_date:
-            month_of_season = (
-                date.to_period("M") - post_start_date.to_period("M")
-            ).n + 1
-            week_of_season = (
-                date.to_period("W-SUN") - post_start_date.to_period("W-SUN")
-            ).n + 1
-            return pd.Series(
-                [season, "post", day_of_week, month, month_of_season, week_of_season]
+        )
+        matched = in_reg | in_post
+
+        # Periods are counted from the start of the regular season or postseason
+        phase_starts = np.where(
+            in_reg, reg_starts[safe_positions], post_starts[safe_positions]
+        )
+        months = times.astype("datetime64[M]").astype(np.int64)
+        days = times.astype("datetime64[D]").astype(np.int64)
+        # 1970-01-01 is a Thursday, shifting by 3 days aligns weeks to Monday-Sunday
+        weeks = (days + 3) // 7
+        phase_start_days = phase_starts.astype("datetime64[D]").astype(np.int64)
+        timeframe = {
+            "season": self.seasons[safe_positions],
+            "season_type": np.where(in_reg, "reg", "post").astype(object),
+            "day_of_week": (days + 3) % 7,
+            "month": months % 12 + 1,
+            "month_of_season": months
+            - phase_starts.astype("datetime64[M]").astype(np.int64)
+            + 1,
+            "week_of_season": weeks - (phase_start_days + 3) // 7 + 1,
+        }
+
+        if not matched.all():
+            for column, values in timeframe.items():
+                if values.dtype == object:
+                    timeframe[column] = np.where(matched, values, None)
+                else:
+                    timeframe[column] = np.where(matched, values, np.nan)
+
+        return pd.DataFrame(timeframe, index=index)
+
+    def _season_types(self, days, positions):
+        # 0: Regular Season, 1: between the regular season and playoffs, 2: Playoffs
+        season_type_codes = np.where(
+            days <= self.reg_season_end_dates[positions],
+            0,
+            np.where(days >= self.postseason_start_dates[positions], 2, 1),
+        )
+        return self.SEASON_TYPES[season_type_codes]
+
+
+SEASON_CALENDAR = SeasonCalendar()
+
+# Shared categorical vocabularies for the ETL. Categories are sorted, so sorting
+# and grouping on the codes orders rows the same way as on the strings.
+TEAM_DTYPE = pd.CategoricalDtype(sorted(set(TEAM_MAP.values())))
+SEASON_DTYPE = pd.CategoricalDtype(sorted(SEASON_CALENDAR.seasons))
+SEASON_TYPE_DTYPE = pd.CategoricalDtype(sorted(SeasonCalendar.SEASON_TYPES))
+GAME_SET_DTYPE = pd.CategoricalDtype(["all", "l2w"])
+
+CATEGORICAL_COLUMNS = {
+    "home_team": TEAM_DTYPE,
+    "away_team": TEAM_DTYPE,
+    "team_name": TEAM_DTYPE,
+    "season": SEASON_DTYPE,
+    "season_type": SEASON_TYPE_DTYPE,
+    "games": GAME_SET_DTYPE,
+}
+
+
+def apply_categorical_vocabulary(df, columns=None):
+    """
+    Converts the team, season, season type and game set columns of df (or only
+    the given ones) to their shared categorical dtype, in place. Values outside
+    of the vocabulary raise a ValueError instead of becoming missing.
+    """
+    if columns is None:
+        columns = [col for col in CATEGORICAL_COLUMNS if col in df.columns]
+    for col in columns:
+        dtype = CATEGORICAL_COLUMNS[col]
+        values = df[col].astype(dtype)
+        unknown = df[col].notna() & values.isna()
+        if unknown.any():
+            raise ValueError(
+                f"Values of {col} not in its vocabulary: {sorted(df.loc[unknown, col].unique())}"
             )
+        df[col] = values
+    return df
+
 
-    return pd.Series([None, None, None, None, None, None])
-
-
-def add_season_timeframe_info(df):
-    season_info_columns = df["game_datetime"].apply(
-        lambda x: determine_season_type(x, NBA_IMPORTANT_DATES)
-    )
-    season_info_columns.columns = [
-        "season",
-        "season_type",
-        "day_of_week",
-        "month",
-        "month_of_season",
-        "week_of_season",
-    ]
+def find_season_information(date_str):
+    return SEASON_CALENDAR.find(date_str)
+
+
+def determine_season_type(date, important_dates):
+    if important_dates is NBA_IMPORTANT_DATES:
+        calendar = SEASON_CALENDAR
+    else:
+        calendar = SeasonCalendar(important_dates)
+    timeframe = calendar.timeframe_info(pd.Series([pd.to_datetime(date)]))
+    if timeframe["season"].iloc[0] is None:
+        return pd.Series([None, None, None, None, None, None])
+    return pd.Series(timeframe.iloc[0].tolist())
+
+
+def add_season_timeframe_info(df, datetime_column="game_datetime"):
+    season_info_columns = SEASON_CALENDAR.timeframe_info(df[datetime_column])
     df = pd.concat([df, season_info_columns], axis=1)
     return df
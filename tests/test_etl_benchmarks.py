@@ -0,0 +1,35 @@
+import os
+import sys
+
+here = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(here, ".."))
+
+from src.etl.etl_benchmarks import (
+    MAX_PEAK_RATIO,
+    check_team_history,
+    check_team_schedule,
+    check_zscore_and_percentiles,
+    full_rebuild_peak_memory,
+    prepare_tables,
+)
+from src.etl.synthetic_data import synthetic_etl_inputs, synthetic_games
+
+# Small-scale runs of the offline ETL benchmark checks on synthetic data
+
+
+def test_full_rebuild_peak_memory():
+    stats = full_rebuild_peak_memory(2)
+    assert stats["peak_to_data"] <= MAX_PEAK_RATIO, stats
+
+
+def test_zscore_and_percentiles():
+    _, nbastats_team_dfs = synthetic_etl_inputs(1)
+    check_zscore_and_percentiles(prepare_tables(nbastats_team_dfs))
+
+
+def test_team_history():
+    check_team_history(synthetic_games(2))
+
+
+def test_team_schedule():
+    check_team_schedule(synthetic_games(2))